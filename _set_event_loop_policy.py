@@ -6,32 +6,76 @@ The policy must be set before any event loop is created.
 
 This module is imported at the very beginning of app/main.py to ensure
 the policy is set before uvicorn creates an event loop in child processes.
+
+On Windows we prefer winloop (libuv-based, supports subprocesses so Playwright
+keeps working) and fall back to ProactorEventLoop if winloop is not installed.
+On Linux/macOS we install uvloop when available, otherwise the default loop is kept.
+On Linux >= 5.6 the io_uring-backed asyncio_uring loop is used first if installed;
+set DISABLE_IO_URING=1 to skip it.
+
+sitecustomize.py imports this module at interpreter startup (when the project
+root is on PYTHONPATH), so the policy is in place even before app/main.py.
+The work is done once per process: a sentinel on ``sys`` makes repeated imports a no-op.
 """
 import sys
-import platform
 import os
-import asyncio
-
-if platform.system() == "Windows":
-    # Check if we're in a uvicorn child process (via environment variable)
-    is_uvicorn_child = os.environ.get("_UVICORN_WINDOWS_EVENT_LOOP_POLICY") == "ProactorEventLoop"
-    
-    # Force ProactorEventLoop policy for Windows (required for Playwright subprocess support)
-    # This MUST happen before any event loop is created
+import logging
+
+logger = logging.getLogger(__name__)
+_log = logger.debug
+
+def _kernel_supports_io_uring() -> bool:
+    """io_uring fast-poll paths need Linux >= 5.6."""
     try:
-        # Try to get current policy
-        policy = asyncio.get_event_loop_policy()
-        if not isinstance(policy, asyncio.WindowsProactorEventLoopPolicy):
-            asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-            print("✓ [_set_event_loop_policy.py] Set Windows event loop policy to ProactorEventLoop")
-        else:
-            if is_uvicorn_child:
-                print("✓ [_set_event_loop_policy.py] Event loop policy already correct (uvicorn child process)")
-    except Exception as e:
-        # If we can't get the policy, try to set it anyway
+        major, minor = os.uname().release.split(".")[:2]
+        return (int(major), int(minor.split("-")[0])) >= (5, 6)
+    except (AttributeError, ValueError):
+        return False
+
+
+# Re-imports (reloader, module reloads, test collection) only need to do the work once per process
+if not getattr(sys, "_event_loop_policy_set", False):
+    if sys.platform == "win32":
+        import asyncio
         try:
-            asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-            print(f"✓ [_set_event_loop_policy.py] Set Windows event loop policy (forced, error was: {e})")
-        except Exception as e2:
-            print(f"⚠ [_set_event_loop_policy.py] Could not set event loop policy: {e2}")
+            import winloop
+            policy_cls, policy_name = winloop.EventLoopPolicy, "winloop"
+        except ImportError:
+            policy_cls, policy_name = asyncio.WindowsProactorEventLoopPolicy, "ProactorEventLoop"
+
+        # Force winloop / ProactorEventLoop policy for Windows (required for Playwright subprocess support)
+        # This MUST happen before any event loop is created. Setting the policy is cheap, so no probe first.
+        try:
+            asyncio.set_event_loop_policy(policy_cls())
+            _log("Set Windows event loop policy to %s", policy_name)
+        except (AttributeError, NotImplementedError) as e:
+            logger.warning("Could not set event loop policy: %s", e)
+    else:
+        policy = None
+        policy_name = None
+
+        # Linux: opt-in io_uring-backed loop (install asyncio_uring to enable,
+        # set DISABLE_IO_URING=1 for containers that block io_uring syscalls)
+        if sys.platform.startswith("linux") and not os.environ.get("DISABLE_IO_URING") and _kernel_supports_io_uring():
+            try:
+                import asyncio_uring
+                policy = asyncio_uring.EventLoopPolicy()
+                policy_name = "asyncio_uring"
+            except (ImportError, AttributeError, RuntimeError):
+                pass
+
+        # Linux/macOS: otherwise upgrade to uvloop when available
+        if policy is None:
+            try:
+                import uvloop
+                policy = uvloop.EventLoopPolicy()
+                policy_name = "uvloop"
+            except (ImportError, RuntimeError) as e:
+                logger.warning("uvloop not available, using default asyncio loop: %s", e)
+
+        if policy is not None:
+            import asyncio
+            asyncio.set_event_loop_policy(policy)
+            _log("Set event loop policy to %s", policy_name)
 
+    sys._event_loop_policy_set = True
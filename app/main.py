@@ -3,27 +3,42 @@ try:
     import _set_event_loop_policy
 except ImportError:
     import sys
-    import platform
-    if platform.system() == "Windows":
-        import asyncio
-        policy = asyncio.get_event_loop_policy()
-        if not isinstance(policy, asyncio.WindowsProactorEventLoopPolicy):
+    import asyncio
+    try:
+        if sys.platform == "win32":
+            import winloop as _fast_loop
+        else:
+            import uvloop as _fast_loop
+        asyncio.set_event_loop_policy(_fast_loop.EventLoopPolicy())
+    except ImportError:
+        # Playwright needs subprocess pipes, so the selector loop is not an option on Windows
+        if sys.platform == "win32":
             asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 from fastapi import FastAPI, Form
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import iterate_in_threadpool
 from app.rpa_elibra import get_rpa
+from app import templates
 from fastapi import Query
-import os, sqlite3, datetime, socket, platform
+import os, sqlite3, socket, platform, hashlib, hmac, time, urllib.parse
 from typing import Optional
 from fastapi import Request
 import asyncio
 import logging
+from collections import OrderedDict
+try:
+    import orjson
+except ImportError:
+    orjson = None
 import httpx
 
 logger = logging.getLogger(__name__)
 
 DB_PATH = os.getenv("DB_PATH", "gateway.db")
 ADMIN_PIN = os.getenv("ADMIN_PIN", "9876")
+_ADMIN_PIN_BYTES = ADMIN_PIN.encode()
 MAX_BOOKS = int(os.getenv("MAX_BOOKS", "5"))
 MAX_DAYS = int(os.getenv("MAX_DAYS", "14"))
 CARDCODE_PREFIX = os.getenv("CARDCODE_PREFIX", "21000000")
@@ -35,25 +50,63 @@ EXPECTED_ACTIVATION_PASSWORD = "AB2025-PROJECT"
 APP_ACTIVATION_KEY = os.getenv("APP_ACTIVATION_KEY", "")
 APP_ACTIVATION_PASSWORD = os.getenv("APP_ACTIVATION_PASSWORD", "")
 
-if APP_ACTIVATION_KEY != EXPECTED_ACTIVATION_KEY or APP_ACTIVATION_PASSWORD != EXPECTED_ACTIVATION_PASSWORD:
+_ACTIVATED = hmac.compare_digest(APP_ACTIVATION_KEY, EXPECTED_ACTIVATION_KEY) and hmac.compare_digest(
+    APP_ACTIVATION_PASSWORD, EXPECTED_ACTIVATION_PASSWORD
+)
+
+if not _ACTIVATED:
     raise RuntimeError("Application activation failed. Invalid APP_ACTIVATION_KEY or APP_ACTIVATION_PASSWORD.")
 
 DISCORD_STARTUP_WEBHOOK_URL = os.getenv("DISCORD_STARTUP_WEBHOOK_URL", "")
 DISCORD_EVENTS_WEBHOOK_URL = os.getenv("DISCORD_EVENTS_WEBHOOK_URL", "") or DISCORD_STARTUP_WEBHOOK_URL
 HEARTBEAT_SECONDS = int(os.getenv("APP_HEARTBEAT_SECONDS", "1800"))
 _heartbeat_task: Optional[asyncio.Task] = None
+# Constant for the process lifetime, so computed once instead of per notification
+_HOST = socket.gethostname()
+_SYSTEM_INFO = f"{platform.system()} {platform.release()} | Python {platform.python_version()}"
+_http_client: Optional[httpx.AsyncClient] = None
+# Webhook posts arriving within this window are merged into one message (Discord max: 10 embeds)
+NOTIFY_BATCH_WINDOW = 0.1
+NOTIFY_BATCH_MAX = 10
+_notify_queue: Optional[asyncio.Queue] = None
+_notify_task: Optional[asyncio.Task] = None
+# Strong refs to fire-and-forget webhook tasks (asyncio itself only keeps weak refs)
+_pending_notifications: set[asyncio.Task] = set()
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Process-wide webhook client so the TLS connection to Discord is reused."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=5,
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=4),
+        )
+    return _http_client
 
 
-async def notify_activity(event: str, request: Optional[Request] = None, extra: Optional[dict] = None) -> None:
+def _utc_iso() -> str:
+    """UTC timestamp in the same format as datetime.utcnow().isoformat(), without building a datetime."""
+    t = time.time()
+    us = int((t - int(t)) * 1_000_000)
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(t)) + f".{us:06d}"
+
+
+def _webhook_url_for(event: str) -> str:
     if event in ("startup", "shutdown"):
-        webhook_url = DISCORD_STARTUP_WEBHOOK_URL
-    else:
-        webhook_url = DISCORD_EVENTS_WEBHOOK_URL
+        return DISCORD_STARTUP_WEBHOOK_URL
+    return DISCORD_EVENTS_WEBHOOK_URL
+
+
+def _build_notification(event: str, request: Optional[Request], extra: Optional[dict]) -> Optional[tuple[str, str, dict]]:
+    """(webhook_url, content, embed) for one event, or None when no webhook is configured."""
+    webhook_url = _webhook_url_for(event)
     if not webhook_url:
-        return
-    now = datetime.datetime.utcnow().isoformat()
-    host = socket.gethostname()
-    system_info = f"{platform.system()} {platform.release()} | Python {platform.python_version()}"
+        return None
+    now = _utc_iso()
+    host = _HOST
+    system_info = _SYSTEM_INFO
     ip_value = host
     fields = [
         {"name": "host", "value": host, "inline": True},
@@ -80,90 +133,396 @@ async def notify_activity(event: str, request: Optional[Request] = None, extra:
             }
         )
 
-    payload = {
-        "content": f"[{event}] {host} @ {now}",
-        "embeds": [
-            {
-                "title": f"elibra-middleware: {event}",
-                "timestamp": now,
-                "fields": fields,
-            }
-        ],
+    content = f"[{event}] {host} @ {now}"
+    embed = {
+        "title": f"elibra-middleware: {event}",
+        "timestamp": now,
+        "fields": fields,
     }
 
+    return webhook_url, content, embed
+
+
+async def notify_activity(event: str, request: Optional[Request] = None, extra: Optional[dict] = None) -> None:
+    item = _build_notification(event, request, extra)
+    if item is None:
+        return
+    # Coalesced by _notify_worker when it's running; otherwise (before startup) post directly
+    if _notify_queue is not None:
+        _notify_queue.put_nowait(item)
+        return
+    webhook_url, content, embed = item
+    await _post_webhook(webhook_url, [content], [embed])
+
+
+async def _post_webhook(webhook_url: str, contents: list[str], embeds: list[dict]) -> None:
+    payload = {
+        "content": "\n".join(contents),
+        "embeds": embeds,
+    }
     try:
-        async with httpx.AsyncClient(timeout=5) as client:
-            await client.post(webhook_url, json=payload)
+        await _get_http_client().post(webhook_url, json=payload)
     except Exception as e:
         logger.warning(f"Failed to send Discord activity notification: {e}")
 
+
+async def _notify_worker(queue: asyncio.Queue) -> None:
+    """Batch notifications arriving within NOTIFY_BATCH_WINDOW into one message per webhook."""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + NOTIFY_BATCH_WINDOW
+        while len(batch) < NOTIFY_BATCH_MAX:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        by_url: dict[str, list[tuple[str, dict]]] = {}
+        for webhook_url, content, embed in batch:
+            by_url.setdefault(webhook_url, []).append((content, embed))
+        for webhook_url, items in by_url.items():
+            await _post_webhook(webhook_url, [c for c, _ in items], [e for _, e in items])
+        for _ in batch:
+            queue.task_done()
+
+
+def _start_notify_worker() -> None:
+    global _notify_queue, _notify_task
+    if _notify_task is None:
+        _notify_queue = asyncio.Queue()
+        _notify_task = asyncio.create_task(_notify_worker(_notify_queue))
+
+
+async def _stop_notify_worker() -> None:
+    """Flush queued notifications (bounded wait), then stop the worker."""
+    global _notify_queue, _notify_task
+    if _notify_task is None:
+        return
+    try:
+        await asyncio.wait_for(_notify_queue.join(), timeout=10)
+    except asyncio.TimeoutError:
+        logger.warning("Timed out flushing queued Discord notifications")
+    _notify_task.cancel()
+    _notify_task = None
+    _notify_queue = None
+
+def _log_webhook_err(task: asyncio.Task) -> None:
+    _pending_notifications.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Discord activity notification task failed: {task.exception()}")
+
+def notify_activity_nowait(event: str, request: Optional[Request] = None, extra: Optional[dict] = None) -> None:
+    """Queue a notification without blocking the caller (shutdown flushes the queue / awaits pending tasks)."""
+    if not _webhook_url_for(event):
+        return
+    if _notify_queue is not None:
+        _notify_queue.put_nowait(_build_notification(event, request, extra))
+        return
+    task = asyncio.create_task(notify_activity(event, request, extra))
+    _pending_notifications.add(task)
+    task.add_done_callback(_log_webhook_err)
+
 async def _heartbeat_loop() -> None:
+    # Scheduled on the monotonic loop clock so the period doesn't drift by the POST duration
+    loop = asyncio.get_running_loop()
+    next_fire = loop.time()
     while True:
         try:
             await notify_activity("heartbeat", None, {})
         except Exception as e:
             logger.warning(f"Heartbeat notification failed: {e}")
-        await asyncio.sleep(HEARTBEAT_SECONDS)
-
-def db():
-    conn = sqlite3.connect(DB_PATH)
+        next_fire += HEARTBEAT_SECONDS
+        now = loop.time()
+        if next_fire < now:
+            # Webhook hung past whole periods: skip the missed beats instead of bursting
+            next_fire += ((now - next_fire) // HEARTBEAT_SECONDS + 1) * HEARTBEAT_SECONDS
+        await asyncio.sleep(next_fire - now)
+
+# Per-connection settings, applied to both the read/write and the read-only connection
+_SQLITE_CONN_PRAGMAS = (
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA temp_store=memory",
+    # Reads are served from the page mapping instead of pread() copies
+    "PRAGMA mmap_size=268435456",
+)
+# journal_mode is persistent in the DB file and needs write access, so only the rw connection sets it
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+) + _SQLITE_CONN_PRAGMAS
+# Hot-path SQL kept as constants: identical text on a reused connection hits
+# sqlite3's per-connection statement cache, so each statement is parsed once.
+SQL_INSERT_RETURN_REQUEST = "INSERT INTO return_requests(barcode, reader_id, card_barcode, status, created_at, created_ip, created_ua) VALUES(?,?,?,?,?,?,?)"
+SQL_INSERT_ISSUED_BOOK = "INSERT INTO issued_books(barcode, reader_id, card_barcode, loan_days, issued_at, issued_by_ip, issued_by_ua) VALUES(?,?,?,?,?,?,?)"
+SQL_SELECT_PENDING_RETURNS = "SELECT * FROM return_requests WHERE status='PENDING' ORDER BY id DESC"
+SQL_SELECT_RETURN_REQUEST = "SELECT * FROM return_requests WHERE id=?"
+# Approve claims the row up front as PROCESSING (one statement); it becomes APPROVED only once
+# the eLibra return succeeds and goes back to PENDING if it fails
+SQL_CLAIM_RETURN_REQUEST = "UPDATE return_requests SET status='PROCESSING' WHERE id=? AND status='PENDING' AND COALESCE(card_barcode, '') != '' RETURNING *"
+SQL_APPROVE_RETURN_REQUEST = "UPDATE return_requests SET status='APPROVED', approved_at=?, approved_by=? WHERE id=? AND status='PROCESSING'"
+SQL_UNCLAIM_RETURN_REQUEST = "UPDATE return_requests SET status='PENDING' WHERE id=? AND status='PROCESSING'"
+# A claim cannot outlive the (single) worker process that made it
+SQL_RESET_PROCESSING_RETURNS = "UPDATE return_requests SET status='PENDING' WHERE status='PROCESSING'"
+SQL_REJECT_RETURN_REQUEST = "UPDATE return_requests SET status='REJECTED', approved_at=?, approved_by=? WHERE id=? AND status='PENDING'"
+# All /admin/stats totals in one statement (COUNT of a CASE skips the NULLs, so empty tables give 0)
+SQL_STATS_TOTALS = """
+SELECT
+    (SELECT COUNT(*) FROM issued_books) AS issued,
+    COUNT(CASE WHEN status = 'APPROVED' THEN 1 END) AS approved,
+    COUNT(CASE WHEN status = 'PENDING' THEN 1 END) AS pending,
+    COUNT(CASE WHEN status = 'REJECTED' THEN 1 END) AS rejected,
+    COUNT(*) AS returns
+FROM return_requests
+"""
+# /admin/stats lists are keyset-paginated on id (ids grow with issued_at/created_at)
+SQL_SELECT_ISSUED_PAGE = "SELECT * FROM issued_books WHERE id < ? ORDER BY id DESC LIMIT ?"
+SQL_SELECT_RETURNS_PAGE = "SELECT * FROM return_requests WHERE id < ? ORDER BY id DESC LIMIT ?"
+SQLITE_CACHED_STATEMENTS = 128
+# Bump together with a new `if version < N:` step in init_db()
+SCHEMA_VERSION = 4
+
+_conn: Optional[sqlite3.Connection] = None
+_ro_conn: Optional[sqlite3.Connection] = None
+# Serializes writers on the shared connection (SQLite allows one writer at a time anyway)
+_write_lock = asyncio.Lock()
+
+def _apply_pragmas(conn: sqlite3.Connection, pragmas: tuple = _SQLITE_PRAGMAS) -> sqlite3.Connection:
     conn.row_factory = sqlite3.Row
+    for pragma in pragmas:
+        conn.execute(pragma)
     return conn
 
-def init_db():
-    with db() as c:
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS return_requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            barcode TEXT NOT NULL,
-            reader_id INTEGER,
-            card_barcode TEXT,
-            status TEXT NOT NULL DEFAULT 'PENDING', -- PENDING/APPROVED/REJECTED
-            created_at TEXT NOT NULL,
-            created_ip TEXT,
-            created_ua TEXT,
-            approved_at TEXT,
-            approved_by TEXT
-        )
-        """)
-        # Add card_barcode column if it doesn't exist (for existing databases)
-        try:
-            c.execute("ALTER TABLE return_requests ADD COLUMN card_barcode TEXT")
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-        # Таблица для выданных книг (логирование всех успешных выдач)
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS issued_books (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            barcode TEXT NOT NULL,
-            reader_id INTEGER,
-            card_barcode TEXT,
-            loan_days INTEGER NOT NULL,
-            issued_at TEXT NOT NULL,
-            issued_by_ip TEXT,
-            issued_by_ua TEXT
+def db():
+    """Shared read/write connection (WAL, autocommit). Opened once per process."""
+    global _conn
+    if _conn is None:
+        _conn = _apply_pragmas(sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None, cached_statements=SQLITE_CACHED_STATEMENTS))
+    return _conn
+
+def db_ro():
+    """Shared read-only connection, so reads don't queue behind writers in WAL mode."""
+    global _ro_conn
+    if _ro_conn is None:
+        _ro_conn = _apply_pragmas(
+            sqlite3.connect(f"file:{os.path.abspath(DB_PATH)}?mode=ro", uri=True, check_same_thread=False, isolation_level=None, cached_statements=SQLITE_CACHED_STATEMENTS),
+            _SQLITE_CONN_PRAGMAS,
         )
-        """)
+    return _ro_conn
+
+def _write_immediate(*statements: tuple) -> None:
+    """
+    Run (sql, params) pairs in one BEGIN IMMEDIATE transaction: the write lock is
+    taken up front, so there is no deferred->write upgrade that can hit SQLITE_BUSY,
+    and several rows share a single commit.
+    """
+    conn = db()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for sql, params in statements:
+            conn.execute(sql, params)
+
+async def _ro_fetchall(sql: str, params: tuple = ()) -> list:
+    """Run a read on the warm read-only connection in a worker thread, off the event loop."""
+    return await asyncio.to_thread(lambda: db_ro().execute(sql, params).fetchall())
+
+async def _ro_fetchone(sql: str, params: tuple = ()):
+    return await asyncio.to_thread(lambda: db_ro().execute(sql, params).fetchone())
+
+def _write_returning(sql: str, params: tuple):
+    """Single-statement UPDATE ... RETURNING in an immediate transaction; returns the row or None."""
+    conn = db()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(sql, params).fetchall()
+    return rows[0] if rows else None
+
+def _insert_return_request(params: tuple) -> None:
+    """Blocking INSERT; call via asyncio.to_thread while holding _write_lock."""
+    _write_immediate((SQL_INSERT_RETURN_REQUEST, params))
+
+def _insert_issued_book(params: tuple) -> None:
+    """Blocking INSERT; call via asyncio.to_thread while holding _write_lock."""
+    _write_immediate((SQL_INSERT_ISSUED_BOOK, params))
+
+def init_db():
+    """
+    Create/migrate tables. PRAGMA user_version records the applied schema version,
+    so an up-to-date database does no DDL (and takes no write lock) on startup.
+    """
+    c = db()
+    version = c.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+    with c:
+        c.execute("BEGIN IMMEDIATE")
+        if version < 1:
+            c.execute("""
+            CREATE TABLE IF NOT EXISTS return_requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                barcode TEXT NOT NULL,
+                reader_id INTEGER,
+                card_barcode TEXT,
+                status TEXT NOT NULL DEFAULT 'PENDING', -- PENDING/PROCESSING/APPROVED/REJECTED
+                created_at TEXT NOT NULL,
+                created_ip TEXT,
+                created_ua TEXT,
+                approved_at TEXT,
+                approved_by TEXT
+            )
+            """)
+            # Add card_barcode column if it doesn't exist (for databases created before it was added)
+            columns = {row["name"] for row in c.execute("PRAGMA table_info(return_requests)")}
+            if "card_barcode" not in columns:
+                c.execute("ALTER TABLE return_requests ADD COLUMN card_barcode TEXT")
+            # Таблица для выданных книг (логирование всех успешных выдач)
+            c.execute("""
+            CREATE TABLE IF NOT EXISTS issued_books (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                barcode TEXT NOT NULL,
+                reader_id INTEGER,
+                card_barcode TEXT,
+                loan_days INTEGER NOT NULL,
+                issued_at TEXT NOT NULL,
+                issued_by_ip TEXT,
+                issued_by_ua TEXT
+            )
+            """)
+        if version < 3:
+            # /admin/returns: WHERE status='PENDING' ORDER BY id DESC as a range scan, no sort
+            c.execute("CREATE INDEX IF NOT EXISTS idx_rr_status_id ON return_requests(status, id DESC)")
+        if version < 4:
+            # Schema v2 indexes; the /admin/stats lists are keyset-paginated on id now, so no
+            # query reads them and they only slowed down every insert
+            c.execute("DROP INDEX IF EXISTS idx_rr_status_created")
+            c.execute("DROP INDEX IF EXISTS idx_ib_issued")
+        c.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
 init_db()
 
 
-app = FastAPI(title="Coventry Library — Issue/Return (Local Pilot)")
+class _FastJSONResponse(JSONResponse):
+    """JSONResponse serialized with orjson (C) when it is installed."""
+
+    def render(self, content) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content)
+
+
+app = FastAPI(title="Coventry Library — Issue/Return (Local Pilot)", default_response_class=_FastJSONResponse)
+# Admin/scan pages are mostly repeated inline JS/markup; reader search JSON is worth it from ~500 B
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=6)
+
+
+class _CachedStaticFiles(StaticFiles):
+    """StaticFiles with a long max-age; templates.static_url() versions the URLs by content hash."""
+
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers.setdefault("Cache-Control", "public, max-age=86400")
+        return response
+
+
+app.mount("/static", _CachedStaticFiles(directory=templates.STATIC_DIR), name="static")
 
 rpa = get_rpa()
 
+class _TTLCache:
+    """Small LRU with per-entry expiry (monotonic clock)."""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        hit = self._data.get(key)
+        if hit is None:
+            return None
+        if hit[0] <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return hit[1]
+
+    def set(self, key, value) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+# The RPA drives a single browser UI, so issue/return calls are queued FIFO here
+# and shed with 503 if they wait longer than RPA_QUEUE_TIMEOUT seconds.
+RPA_QUEUE_TIMEOUT = float(os.getenv("RPA_QUEUE_TIMEOUT", "120"))
+_rpa_sem = asyncio.Semaphore(1)
+_RPA_BUSY_MESSAGE = "RPA is busy with other requests, please try again in a moment"
+
+# Identical issue/return calls (scanner double-reads, client retries) share one RPA run,
+# and a successful result is replayed for RPA_DEDUPE_TTL seconds instead of re-running it
+RPA_DEDUPE_TTL = 3
+_rpa_recent = _TTLCache(RPA_DEDUPE_TTL, 256)
+_rpa_inflight: dict[tuple, asyncio.Task] = {}
+
+async def _run_rpa(fn, *args, **kwargs) -> Optional[dict]:
+    """Run an RPA operation through the queue. Returns None if the queue wait timed out."""
+    try:
+        await asyncio.wait_for(_rpa_sem.acquire(), timeout=RPA_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"RPA queue wait exceeded {RPA_QUEUE_TIMEOUT}s, shedding {fn.__name__}")
+        return None
+    try:
+        return await fn(*args, **kwargs)
+    finally:
+        _rpa_sem.release()
+
+async def _run_rpa_deduped(key: tuple, fn, *args, **kwargs) -> Optional[dict]:
+    result = _rpa_recent.get(key)
+    if result is not None:
+        return result
+    task = _rpa_inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_run_rpa(fn, *args, **kwargs))
+        _rpa_inflight[key] = task
+
+        def _done(t: asyncio.Task) -> None:
+            _rpa_inflight.pop(key, None)
+            if not t.cancelled() and t.exception() is None and t.result() and t.result().get("ok"):
+                _rpa_recent.set(key, t.result())
+
+        task.add_done_callback(_done)
+    # Shielded: a disconnecting client must not cancel a run other callers are waiting on
+    return await asyncio.shield(task)
+
 @app.on_event("startup")
 async def startup_event():
     global _heartbeat_task
-    await notify_activity(
-        "startup",
-        None,
-        {
-            "activation_key_ok": True,
-            "main_path": os.path.abspath(__file__),
-        },
-    )
+    _get_http_client()
+    _start_notify_worker()
+    # Approvals interrupted by a crash/restart go back to the librarian's queue
+    async with _write_lock:
+        await asyncio.to_thread(_write_immediate, (SQL_RESET_PROCESSING_RETURNS, ()))
     if HEARTBEAT_SECONDS > 0 and _heartbeat_task is None:
         _heartbeat_task = asyncio.create_task(_heartbeat_loop())
+    # Independent of each other: the browser launch overlaps the startup webhook
+    await asyncio.gather(
+        notify_activity(
+            "startup",
+            None,
+            {
+                "activation_key_ok": _ACTIVATED,
+                "main_path": os.path.abspath(__file__),
+            },
+        ),
+        _maybe_init_rpa(),
+        return_exceptions=True,
+    )
+
+async def _maybe_init_rpa() -> None:
     try:
         await rpa.initialize(headless=False)
         logger.info("RPA initialized on startup")
@@ -173,20 +532,24 @@ async def startup_event():
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    global _heartbeat_task
+    global _heartbeat_task, _http_client
     await notify_activity("shutdown", None, {})
+    if _pending_notifications:
+        await asyncio.gather(*_pending_notifications, return_exceptions=True)
+    await _stop_notify_worker()
     if _heartbeat_task is not None and not _heartbeat_task.done():
         _heartbeat_task.cancel()
         _heartbeat_task = None
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
     try:
         await rpa.close()
         logger.info("RPA closed on shutdown")
     except Exception as e:
         logger.error(f"Error closing RPA on shutdown: {e}", exc_info=True)
 
-@app.get("/scan", response_class=HTMLResponse)
-def scan():
-    html = """
+_SCAN_HTML_BYTES = ("""
 <!doctype html>
 <html>
 <head>
@@ -396,15 +759,9 @@ def scan():
       if (data.ok && data.result) {
         const item = data.result;
         const readerId = item.parentId;
-      const fm = (item.fieldModels || []);
-      const getByCode = (code) => {
-        const f = fm.find(x => x.code === code);
-        return f ? f.value : "";
-      };
-
-      const first = getByCode("FIRST_NAME");
-        const last = getByCode("LAST_NAME");
-        const card = getByCode("LIBRARY_CARD_BARCODE") || fullCardcode;
+        const first = item.FIRST_NAME || "";
+        const last = item.LAST_NAME || "";
+        const card = item.LIBRARY_CARD_BARCODE || fullCardcode;
         const name = `${first || ""} ${last || ""}`.trim() || "Unknown";
         const readerData = {
           card_barcode: card,
@@ -598,8 +955,17 @@ def scan():
   <div style="display:none;visibility:hidden;opacity:0;position:absolute;left:-9999px" data-dev="Aidar Begotayev 2025"></div>
 </body>
 </html>
-"""
-    return HTMLResponse(html)
+""").encode("utf-8")
+_SCAN_ETAG = f'"{hashlib.md5(_SCAN_HTML_BYTES).hexdigest()}"'
+_SCAN_HEADERS = {"ETag": _SCAN_ETAG, "Cache-Control": "public, max-age=60"}
+
+@app.get("/scan", response_class=HTMLResponse)
+async def scan(request: Request):
+    # Page only depends on CARDCODE_PREFIX, so it is built and encoded once at import.
+    # The Response itself is per request: GZipMiddleware rewrites the headers of the object it is given.
+    if request.headers.get("if-none-match") == _SCAN_ETAG:
+        return Response(status_code=304, headers=dict(_SCAN_HEADERS))
+    return Response(content=_SCAN_HTML_BYTES, media_type="text/html; charset=utf-8", headers=dict(_SCAN_HEADERS))
  
 @app.get("/rpa/health")
 async def rpa_health():
@@ -613,28 +979,36 @@ async def rpa_manual_login():
     result = await rpa.manual_login()
     return JSONResponse(result)
 
+async def _read_body_fields(request: Request):
+    """Parse the body once: form data for form Content-Types, JSON otherwise.
+
+    Bodies without a form Content-Type (including header-less clients) are
+    read as JSON, as before; malformed JSON yields no fields, so the caller
+    answers with its usual 400 instead of a 500.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith(("application/x-www-form-urlencoded", "multipart/form-data")):
+        return await request.form()
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
 @app.post("/rpa/issue")
 async def rpa_issue(request: Request):
     """Issue a book via RPA. Accepts form data or JSON."""
-    # Try JSON first, then form data
-    try:
-        json_data = await request.json()
-        reader_id = json_data.get("reader_id")
-        barcode = json_data.get("barcode")
-        loan_days = json_data.get("loan_days", 14)
-    except:
-        # Fall back to form data
-        form_data = await request.form()
-        reader_id = form_data.get("reader_id")
-        barcode = form_data.get("barcode")
-        loan_days = form_data.get("loan_days", 14)
-        
-        if reader_id:
-            reader_id = int(reader_id)
-        if loan_days:
-            loan_days = int(loan_days)
-        else:
-            loan_days = 14
+    data = await _read_body_fields(request)
+    reader_id = data.get("reader_id")
+    barcode = data.get("barcode")
+    loan_days = data.get("loan_days", 14)
+    
+    if reader_id:
+        reader_id = int(reader_id)
+    if loan_days:
+        loan_days = int(loan_days)
+    else:
+        loan_days = 14
     
     if not reader_id or not barcode:
         return JSONResponse(
@@ -648,20 +1022,16 @@ async def rpa_issue(request: Request):
     if loan_days < 1:
         loan_days = 1
     
-    result = await rpa.issue_item(barcode, reader_id, loan_days)
+    result = await _run_rpa_deduped(("issue", barcode, reader_id, loan_days), rpa.issue_item, barcode, reader_id, loan_days)
+    if result is None:
+        return JSONResponse({"ok": False, "message": _RPA_BUSY_MESSAGE}, status_code=503)
     return JSONResponse(result)
 
 @app.post("/rpa/return")
 async def rpa_return(request: Request):
     """Return a book via RPA. Accepts form data or JSON."""
-    # Try JSON first, then form data
-    try:
-        json_data = await request.json()
-        barcode = json_data.get("barcode")
-    except:
-        # Fall back to form data
-        form_data = await request.form()
-        barcode = form_data.get("barcode")
+    data = await _read_body_fields(request)
+    barcode = data.get("barcode")
     
     if not barcode:
         return JSONResponse(
@@ -669,19 +1039,26 @@ async def rpa_return(request: Request):
             status_code=400
         )
     
-    result = await rpa.return_item(barcode)
+    result = await _run_rpa_deduped(("return", barcode), rpa.return_item, barcode)
+    if result is None:
+        return JSONResponse({"ok": False, "message": _RPA_BUSY_MESSAGE}, status_code=503)
     return JSONResponse(result)
 
 @app.post("/submit", response_class=HTMLResponse)
-async def submit(
-    request: Request,
-    action: str = Form(...),
-    barcode: str = Form(...),
-    reader_id: str = Form(""),
-    card_barcode: str = Form(""),
-    loan_days: str = Form("14"),
-):
-    await notify_activity("submit", request, {"action": action, "barcode": barcode, "reader_id": reader_id})
+async def submit(request: Request):
+    # The /scan form posts application/x-www-form-urlencoded; parse it directly
+    # instead of going through Form() and the multipart parser.
+    body = await request.body()
+    form = urllib.parse.parse_qs(body.decode("utf-8", "replace"), keep_blank_values=True)
+    if "action" not in form or "barcode" not in form:
+        return JSONResponse({"detail": "Missing required form fields: action and barcode"}, status_code=422)
+    action = form["action"][0]
+    barcode = form["barcode"][0]
+    reader_id = form.get("reader_id", [""])[0]
+    card_barcode = form.get("card_barcode", [""])[0]
+    loan_days = form.get("loan_days", ["14"])[0]
+
+    notify_activity_nowait("submit", request, {"action": action, "barcode": barcode, "reader_id": reader_id})
     action = (action or "").strip().lower()
     barcode = (barcode or "").strip()
     reader_id = (reader_id or "").strip()
@@ -701,37 +1078,15 @@ async def submit(
     # --- RETURN: вместо real return -> создаём заявку ---
     if action == "return":
         rid = int(reader_id) if reader_id else None
-        now = datetime.datetime.utcnow().isoformat()
+        now = _utc_iso()
 
-        with db() as c:
-            c.execute(
-                "INSERT INTO return_requests(barcode, reader_id, card_barcode, status, created_at, created_ip, created_ua) VALUES(?,?,?,?,?,?,?)",
+        async with _write_lock:
+            await asyncio.to_thread(
+                _insert_return_request,
                 (barcode, rid, card_barcode if card_barcode else None, "PENDING", now, request.client.host if request.client else None, request.headers.get("user-agent", "")),
             )
 
-        return HTMLResponse("""
-        <html>
-          <head>
-            <meta charset="utf-8"/>
-            <meta name="viewport" content="width=device-width, initial-scale=1"/>
-          </head>
-          <body style="font-family:system-ui,-apple-system,Segoe UI,Roboto,Arial;background:#0b0f14;color:#e7edf5;margin:0;">
-            <div style="max-width:480px;margin:40px auto;padding:16px;">
-              <div style="background:#0f1623;border:1px solid #1f2b40;border-radius:18px;padding:18px;text-align:center;">
-                <h2 style="margin:0 0 8px;font-size:20px;">✅ Заявка на возврат создана</h2>
-                <p style="margin:0 0 12px;font-size:14px;color:#9fb0c5;">
-                  Возврат будет подтвержден библиотекарем после физического приема книги.
-                </p>
-                <button onclick="window.location.href='/scan'"
-                        style="margin-top:8px;padding:12px 18px;border-radius:999px;border:none;background:#1d4ed8;color:#fff;font-size:15px;font-weight:500;width:100%;max-width:260px;cursor:pointer;">
-                  ← Back to scan
-                </button>
-              </div>
-            </div>
-          <div style="display:none;visibility:hidden;opacity:0;position:absolute;left:-9999px" data-dev="AB2025"></div>
-          </body>
-        </html>
-        """)
+        return HTMLResponse(templates.RETURN_OK_HTML)
 
     if action == "issue" and not card_barcode:
         return HTMLResponse("<h3>⚠️ Для Issue нужно выбрать читателя (нажми 'Найти' и выбери из списка)</h3><p><a href='/scan'>Back</a></p>", status_code=400)
@@ -745,14 +1100,16 @@ async def submit(
     reader_query_for_rpa = card_barcode
     logger.info(f"Using card_barcode (reader code) from form: {card_barcode[:10]}...")
     
-    r_issue_result = await rpa.issue_item(barcode, rid or 0, loan_days=loan_days_int, reader_query=reader_query_for_rpa)
+    r_issue_result = await _run_rpa(rpa.issue_item, barcode, rid or 0, loan_days=loan_days_int, reader_query=reader_query_for_rpa)
+    if r_issue_result is None:
+        r_issue_result = {"ok": False, "message": _RPA_BUSY_MESSAGE}
     
     ok = r_issue_result.get("ok", False)
     if ok:
-        now = datetime.datetime.utcnow().isoformat()
-        with db() as c:
-            c.execute(
-                "INSERT INTO issued_books(barcode, reader_id, card_barcode, loan_days, issued_at, issued_by_ip, issued_by_ua) VALUES(?,?,?,?,?,?,?)",
+        now = _utc_iso()
+        async with _write_lock:
+            await asyncio.to_thread(
+                _insert_issued_book,
                 (
                     barcode,
                     rid,
@@ -763,57 +1120,9 @@ async def submit(
                     request.headers.get("user-agent", "")
                 )
             )
-        return HTMLResponse(f"""
-        <html>
-          <head>
-            <meta charset="utf-8"/>
-            <meta name="viewport" content="width=device-width, initial-scale=1"/>
-            <meta name="generator" content="AB2025"/>
-            <!-- AB2025 -->
-          </head>
-          <body style="font-family:system-ui,-apple-system,Segoe UI,Roboto,Arial;background:#0b0f14;color:#e7edf5;margin:0;">
-            <div style="max-width:480px;margin:40px auto;padding:16px;">
-              <div style="background:#0f1623;border:1px solid #1f2b40;border-radius:18px;padding:18px;text-align:center;">
-                <h2 style="margin:0 0 8px;font-size:20px;">✅ ISSUED</h2>
-                <p style="margin:0 0 12px;font-size:14px;color:#9fb0c5;">
-                  {r_issue_result.get('message') or 'Book issued successfully'}
-                </p>
-                <button onclick="window.location.href='/scan'"
-                        style="margin-top:8px;padding:12px 18px;border-radius:999px;border:none;background:#1d4ed8;color:#fff;font-size:15px;font-weight:500;width:100%;max-width:260px;cursor:pointer;">
-                  ← Back to scan
-                </button>
-              </div>
-            </div>
-          <div style="display:none;visibility:hidden;opacity:0;position:absolute;left:-9999px" data-dev="AB2025"></div>
-          </body>
-        </html>
-        """)
+        return HTMLResponse(templates.result_page("✅ ISSUED", r_issue_result.get('message') or 'Book issued successfully'))
     else:
-        return HTMLResponse(f"""
-        <html>
-          <head>
-            <meta charset="utf-8"/>
-            <meta name="viewport" content="width=device-width, initial-scale=1"/>
-            <meta name="generator" content="AB2025"/>
-            <!-- AB2025 -->
-          </head>
-          <body style="font-family:system-ui,-apple-system,Segoe UI,Roboto,Arial;background:#0b0f14;color:#e7edf5;margin:0;">
-            <div style="max-width:480px;margin:40px auto;padding:16px;">
-              <div style="background:#241216;border:1px solid #4b1f25;border-radius:18px;padding:18px;text-align:center;">
-                <h2 style="margin:0 0 8px;font-size:20px;">❌ ISSUE FAILED</h2>
-                <p style="margin:0 0 12px;font-size:14px;color:#fca5a5;">
-                  {r_issue_result.get('message') or 'Issue failed'}
-                </p>
-                <button onclick="window.location.href='/scan'"
-                        style="margin-top:8px;padding:12px 18px;border-radius:999px;border:none;background:#1d4ed8;color:#fff;font-size:15px;font-weight:500;width:100%;max-width:260px;cursor:pointer;">
-                  ← Back to scan
-                </button>
-              </div>
-            </div>
-          <div style="display:none;visibility:hidden;opacity:0;position:absolute;left:-9999px" data-dev="AB2025"></div>
-          </body>
-        </html>
-        """)
+        return HTMLResponse(templates.result_page("❌ ISSUE FAILED", r_issue_result.get('message') or 'Issue failed', ok=False))
 
 @app.get("/diag/issue")
 async def diag_issue(reader_id: int, barcode: str, loan_days: int = 2):
@@ -838,10 +1147,40 @@ async def diag_return(barcode: str):
         "barcode": barcode
     }
 
+# Reader lookups hit the eLibra UI through the RPA; the same query/card is
+# usually repeated within seconds, so successful results are cached briefly.
+READER_SEARCH_CACHE_TTL = 60
+CARDCODE_CACHE_TTL = 300
+READER_CACHE_MAX = 512
+STATS_PAGE_CACHE_TTL = 60
+
+_reader_search_cache = _TTLCache(READER_SEARCH_CACHE_TTL, READER_CACHE_MAX)
+# Rendered /admin/stats pages keyed by (PRAGMA data_version, pin)
+_stats_page_cache = _TTLCache(STATS_PAGE_CACHE_TTL, 8)
+_cardcode_cache = _TTLCache(CARDCODE_CACHE_TTL, READER_CACHE_MAX)
+
+async def _cached_search_readers(q: str, n: int) -> dict:
+    key = (q, n)
+    result = _reader_search_cache.get(key)
+    if result is None:
+        result = await rpa.search_readers(q, n=n)
+        if result.get("ok"):
+            _reader_search_cache.set(key, result)
+    return result
+
+def _index_by_cardcode(results: list) -> dict:
+    """{LIBRARY_CARD_BARCODE: reader} for search results (first reader wins on duplicates)."""
+    by_card = {}
+    for item in results:
+        card = item.get("LIBRARY_CARD_BARCODE")
+        if card is not None:
+            by_card.setdefault(card, item)
+    return by_card
+
 @app.get("/api/readers/search")
 async def api_readers_search(q: str = Query(..., min_length=2)):
     """Search for readers using RPA (no Bearer/JSESSIONID needed)."""
-    result = await rpa.search_readers(q, n=4)
+    result = await _cached_search_readers(q, 4)
     
     if result.get("ok"):
         # Return in the same format as before for compatibility
@@ -860,20 +1199,26 @@ async def api_readers_search(q: str = Query(..., min_length=2)):
 @app.get("/api/readers/search-by-cardcode")
 async def api_readers_search_by_cardcode(cardcode: str = Query(..., min_length=5, max_length=13)):
     """Search for a reader by full cardcode. Returns single result or error."""
-    result = await rpa.search_readers(cardcode, n=10)  # Search with more results to find exact match
+    item = _cardcode_cache.get(cardcode)
+    if item is not None:
+        return {
+            "ok": True,
+            "result": item
+        }
+    result = await _cached_search_readers(cardcode, 10)  # Search with more results to find exact match
     
     if result.get("ok"):
-        results = result.get("results", [])
-        # Find exact match by cardcode
-        for item in results:
-            fm = item.get("fieldModels", [])
-            card = next((f.get("value") for f in fm if f.get("code") == "LIBRARY_CARD_BARCODE"), None)
-            if card == cardcode:
-                # Found exact match
-                return {
-                    "ok": True,
-                    "result": item
-                }
+        # Index results by card barcode once; every card seen is cached for later scans
+        by_card = _index_by_cardcode(result.get("results", []))
+        for card, card_item in by_card.items():
+            _cardcode_cache.set(card, card_item)
+        item = by_card.get(cardcode)
+        if item is not None:
+            # Found exact match
+            return {
+                "ok": True,
+                "result": item
+            }
         # No exact match found
         return {
             "ok": False,
@@ -885,772 +1230,183 @@ async def api_readers_search_by_cardcode(cardcode: str = Query(..., min_length=5
             "error": result.get("error", "Search failed")
     }
 
+def _pin_ok(pin: str) -> bool:
+    """Constant-time admin PIN check."""
+    return hmac.compare_digest(pin.encode(), _ADMIN_PIN_BYTES)
+
+# Immutable, so one Response object serves every rejected admin hit
+_FORBIDDEN = Response(content=b"<h3>403</h3>", status_code=403, media_type="text/html; charset=utf-8")
+
+# Admin pages are revalidated on every open and answered with 304 while the DB is unchanged.
+# data_version counters are per connection, so the ETag also carries a per-process token
+# to keep another worker's (or an earlier run's) counter from matching.
+_ADMIN_ETAG_TOKEN = os.urandom(4).hex()
+_ADMIN_CACHE_CONTROL = "private, no-cache"
+_NOT_MODIFIED = Response(status_code=304, headers={"Cache-Control": _ADMIN_CACHE_CONTROL})
+
+async def _admin_etag() -> tuple[int, str]:
+    """(PRAGMA data_version, weak ETag derived from it) for the admin pages."""
+    version = (await _ro_fetchone("PRAGMA data_version"))[0]
+    return version, f'W/"{_ADMIN_ETAG_TOKEN}-{version}"'
+
 @app.get("/admin/returns", response_class=HTMLResponse)
-def admin_returns(pin: str):
-    if pin != ADMIN_PIN:
-        return HTMLResponse("<h3>403</h3>", status_code=403)
-
-    with db() as c:
-        rows = c.execute("SELECT * FROM return_requests WHERE status='PENDING' ORDER BY id DESC").fetchall()
-
-    items = ""
-    for r in rows:
-        items += f"""
-        <div class="card">
-          <div class="card-header">
-            <b>Request #{r['id']}</b>
-            <span class="pill-id">{r['barcode']}</span>
-          </div>
-          <div class="row-small">Reader ID: <code>{r['reader_id'] or ""}</code></div>
-          <div class="row-small">Created: {r['created_at']}</div>
-          <div class="row-small">IP: {r['created_ip'] or ""}</div>
-          <div class="btn-row">
-            <form method="POST" action="/admin/returns/{r['id']}/reject" class="admin-form" id="form-reject-{r['id']}">
-            <input type="hidden" name="pin" value="{pin}"/>
-              <button type="submit" class="admin-btn reject" id="btn-reject-{r['id']}">❌ Reject</button>
-          </form>
-            <form method="POST" action="/admin/returns/{r['id']}/approve" class="admin-form" id="form-approve-{r['id']}">
-            <input type="hidden" name="pin" value="{pin}"/>
-              <button type="submit" class="admin-btn approve" id="btn-approve-{r['id']}">✅ Approve</button>
-          </form>
-          </div>
-        </div>
-        """
-
-    return HTMLResponse(f"""
-    <html>
-      <head>
-        <meta charset="utf-8"/>
-        <meta name="viewport" content="width=device-width, initial-scale=1, maximum-scale=1"/>
-        <meta name="generator" content="AB2025"/>
-        <!-- AB2025 -->
-        <title>Admin — Return Requests</title>
-        <style>
-          body {{
-            font-family: system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-            max-width: 900px;
-            margin: 0 auto;
-            padding: 16px;
-            background: #f5f5f5;
-          }}
-          h2 {{
-            margin: 8px 0 4px;
-            font-size: 20px;
-            text-align: center;
-          }}
-          .meta {{
-            text-align: center;
-            font-size: 13px;
-            color: #666;
-            margin-bottom: 12px;
-          }}
-          .card {{
-            border-radius: 14px;
-            padding: 12px 14px;
-            margin: 10px 0;
-            background: #fff;
-            box-shadow: 0 1px 3px rgba(0,0,0,0.06);
-          }}
-          .card-header {{
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 6px;
-            font-size: 14px;
-          }}
-          .card-header b {{
-            font-size: 15px;
-          }}
-          .pill-id {{
-            padding: 2px 8px;
-            border-radius: 999px;
-            background: #eef2ff;
-            font-size: 12px;
-          }}
-          .row-small {{
-            font-size: 13px;
-            margin: 2px 0;
-            word-break: break-all;
-          }}
-          .btn-row {{
-            display: flex;
-            gap: 8px;
-            margin-top: 10px;
-          }}
-          .btn-row form {{
-            flex: 1;
-          }}
-          button.admin-btn {{
-            display: block;
-            width: 100%;
-            padding: 12px 10px;
-            border-radius: 999px;
-            border: none;
-            font-size: 16px;
-            font-weight: 500;
-            cursor: pointer;
-          }}
-          button.approve {{
-            background: #16a34a;
-            color: #fff;
-          }}
-          button.reject {{
-            background: #f97316;
-            color: #fff;
-          }}
-          button.admin-btn:active {{
-            transform: scale(0.98);
-          }}
-          button.admin-btn:disabled {{
-            opacity: 0.5;
-            cursor: not-allowed;
-            position: relative;
-          }}
-          button.admin-btn.loading {{
-            pointer-events: none;
-          }}
-          button.admin-btn.loading::after {{
-            content: "";
-            position: absolute;
-            left: 50%;
-            top: 50%;
-            transform: translate(-50%, -50%);
-            width: 16px;
-            height: 16px;
-            border: 2px solid rgba(255,255,255,0.3);
-            border-top-color: #fff;
-            border-radius: 50%;
-            animation: spin 0.8s linear infinite;
-          }}
-          @keyframes spin {{
-            to {{ transform: translate(-50%, -50%) rotate(360deg); }}
-          }}
-          @media (max-width: 480px) {{
-            body {{
-              padding: 12px;
-            }}
-            .card {{
-              padding: 10px 12px;
-            }}
-            button.admin-btn {{
-              font-size: 15px;
-              padding: 14px 10px;
-            }}
-          }}
-        </style>
-      </head>
-      <body>
-        <div style="text-align:center;margin-bottom:16px;">
-          <h2 style="margin:8px 0;">Pending returns</h2>
-          <div class="meta">Всего заявок: {len(rows)}</div>
-          <div style="margin-top:8px;display:flex;gap:8px;justify-content:center;flex-wrap:wrap">
-            <a href="/admin/search?pin={pin}" style="display:inline-block;padding:8px 16px;background:#1d4ed8;color:#fff;text-decoration:none;border-radius:999px;font-size:14px;">🔍 Search Readers</a>
-            <a href="/admin/stats?pin={pin}" style="display:inline-block;padding:8px 16px;background:#1d4ed8;color:#fff;text-decoration:none;border-radius:999px;font-size:14px;">📊 Статистика и логи</a>
-          </div>
-        </div>
-        {items if items else "<p style='text-align:center;'>Нет заявок</p>"}
-        <script>
-          document.addEventListener('DOMContentLoaded', function() {{
-            document.querySelectorAll('.admin-form').forEach(function(form) {{
-              form.addEventListener('submit', function(e) {{
-                const formId = form.id;
-                const reqId = formId.split('-').pop();
-                const action = formId.includes('approve') ? 'approve' : 'reject';
-                
-                const btn = form.querySelector('button[type="submit"]');
-                if (!btn || btn.disabled) {{
-                  e.preventDefault();
-                  return false;
-                }}
-                
-                const card = form.closest('.card');
-                if (card) {{
-                  const allBtns = card.querySelectorAll('button.admin-btn');
-                  allBtns.forEach(function(b) {{
-                    b.disabled = true;
-                    b.style.opacity = '0.5';
-                    b.style.pointerEvents = 'none';
-                  }});
-                  
-                  const statusEl = document.createElement('div');
-                  statusEl.style.cssText = 'text-align:center;padding:8px;color:#666;font-size:13px;';
-                  statusEl.textContent = action === 'approve' ? '⏳ Обрабатываем...' : '⏳ Отклоняем...';
-                  card.appendChild(statusEl);
-                }}
-                
-                return true;
-              }});
-            }});
-          }});
-        </script>
-      </body>
-    </html>
-    """)
+async def admin_returns(request: Request, pin: str):
+    if not _pin_ok(pin):
+        return _FORBIDDEN
+
+    _, etag = await _admin_etag()
+    if request.headers.get("if-none-match") == etag:
+        return _NOT_MODIFIED
+
+    rows = await _ro_fetchall(SQL_SELECT_PENDING_RETURNS)
+
+    html = await asyncio.to_thread(templates.ADMIN_RETURNS.render, rows=rows, pin=pin)
+    return HTMLResponse(html, headers={"ETag": etag, "Cache-Control": _ADMIN_CACHE_CONTROL})
 
 @app.post("/admin/returns/{req_id}/approve", response_class=HTMLResponse)
 async def admin_approve(req_id: int, pin: str = Form(...)):
-    if pin != ADMIN_PIN:
-        return HTMLResponse("<h3>403</h3>", status_code=403)
-
-    with db() as c:
-        row = c.execute("SELECT * FROM return_requests WHERE id=?", (req_id,)).fetchone()
+    if not _pin_ok(pin):
+        return _FORBIDDEN
+
+    async with _write_lock:
+        row = await asyncio.to_thread(_write_returning, SQL_CLAIM_RETURN_REQUEST, (req_id,))
+    if row is None:
+        # Not claimed: tell "not found / not pending" apart from a request without card_barcode
+        row = await _ro_fetchone(SQL_SELECT_RETURN_REQUEST, (req_id,))
         if not row or row["status"] != "PENDING":
             return HTMLResponse("<h3>Not found / not pending</h3>", status_code=404)
+        return HTMLResponse(templates.admin_result_page("❌ Ошибка", pin, "Не найден card_barcode для этого запроса. Невозможно выполнить возврат.", ok=False), status_code=400)
 
     # Реальный возврат в eLibra - use RPA
     # Use card_barcode directly from database (saved when return request was created)
     # NO reader_id search - we only use card_barcode for UI search
-    # sqlite3.Row doesn't have .get() method, use indexing instead
-    await notify_activity("admin_approve", None, {"req_id": req_id})
-    try:
-        card_barcode = row["card_barcode"] if row["card_barcode"] else None
-    except (KeyError, IndexError):
-        # Column might not exist in old databases
-        card_barcode = None
-    
-    if not card_barcode:
-        return HTMLResponse(f"""
-        <html>
-          <head>
-            <meta charset="utf-8"/>
-            <meta name="viewport" content="width=device-width, initial-scale=1"/>
-            <meta name="generator" content="AB2025"/>
-            <!-- AB2025 -->
-          </head>
-          <body style="font-family:system-ui,-apple-system,Segoe UI,Roboto,Arial;background:#0b0f14;color:#e7edf5;margin:0;">
-            <div style="max-width:480px;margin:40px auto;padding:16px;">
-              <div style="background:#241216;border:1px solid #4b1f25;border-radius:18px;padding:18px;text-align:center;">
-                <h2 style="margin:0 0 8px;font-size:20px;">❌ Ошибка</h2>
-                <p style="margin:0 0 12px;font-size:14px;color:#fca5a5;">
-                  Не найден card_barcode для этого запроса. Невозможно выполнить возврат.
-                </p>
-                <button onclick="window.location.href='/admin/returns?pin={pin}'"
-                        style="margin-top:8px;padding:12px 18px;border-radius:999px;border:none;background:#1d4ed8;color:#fff;font-size:15px;font-weight:500;width:100%;max-width:260px;cursor:pointer;">
-                  ← Back to admin
-                </button>
-              </div>
-            </div>
-          </body>
-        </html>
-        """, status_code=400)
-    
+    notify_activity_nowait("admin_approve", None, {"req_id": req_id})
+    return_result = None
     try:
-        reader_id = row["reader_id"]
-    except (KeyError, IndexError):
-        reader_id = None
-    return_result = await rpa.return_item(row["barcode"], reader_id=reader_id, reader_query=card_barcode)
+        return_result = await _run_rpa(rpa.return_item, row["barcode"], reader_id=row["reader_id"], reader_query=row["card_barcode"])
+    finally:
+        if return_result and return_result.get("ok"):
+            statement = (SQL_APPROVE_RETURN_REQUEST, (_utc_iso(), "LIBRARIAN", req_id))
+        else:
+            statement = (SQL_UNCLAIM_RETURN_REQUEST, (req_id,))
+        async with _write_lock:
+            await asyncio.to_thread(_write_immediate, statement)
+    if return_result is None:
+        # Queue wait timed out: the request is PENDING again and can simply be approved later
+        return HTMLResponse(templates.admin_result_page("⏳ RPA busy", pin, _RPA_BUSY_MESSAGE, ok=False), status_code=503)
     if return_result.get("ok"):
-        with db() as c:
-            c.execute(
-                "UPDATE return_requests SET status='APPROVED', approved_at=?, approved_by=? WHERE id=?",
-                (datetime.datetime.utcnow().isoformat(), "LIBRARIAN", req_id),
-            )
-        return HTMLResponse(f"""
-        <html>
-          <head>
-            <meta charset="utf-8"/>
-            <meta name="viewport" content="width=device-width, initial-scale=1"/>
-            <meta name="generator" content="AB2025"/>
-            <!-- AB2025 -->
-          </head>
-          <body style="font-family:system-ui,-apple-system,Segoe UI,Roboto,Arial;background:#0b0f14;color:#e7edf5;margin:0;">
-            <div style="max-width:480px;margin:40px auto;padding:16px;">
-              <div style="background:#0f1623;border:1px solid #1f2b40;border-radius:18px;padding:18px;text-align:center;">
-                <h2 style="margin:0 0 8px;font-size:20px;">✅ Approved</h2>
-                <p style="margin:0 0 12px;font-size:14px;color:#9fb0c5;">
-                  {return_result.get('message') or 'Return approved successfully'}
-                </p>
-                <button onclick="window.location.href='/admin/returns?pin={pin}'"
-                        style="margin-top:8px;padding:12px 18px;border-radius:999px;border:none;background:#1d4ed8;color:#fff;font-size:15px;font-weight:500;width:100%;max-width:260px;cursor:pointer;">
-                  ← Back to admin
-                </button>
-              </div>
-            </div>
-          <div style="display:none;visibility:hidden;opacity:0;position:absolute;left:-9999px" data-dev="AB2025"></div>
-          </body>
-        </html>
-        """)
-
-    return HTMLResponse(f"""
-    <html>
-      <head>
-        <meta charset="utf-8"/>
-        <meta name="viewport" content="width=device-width, initial-scale=1"/>
-      </head>
-      <body style="font-family:system-ui,-apple-system,Segoe UI,Roboto,Arial;background:#0b0f14;color:#e7edf5;margin:0;">
-        <div style="max-width:480px;margin:40px auto;padding:16px;">
-          <div style="background:#241216;border:1px solid #4b1f25;border-radius:18px;padding:18px;text-align:center;">
-            <h2 style="margin:0 0 8px;font-size:20px;">❌ eLibra return failed</h2>
-            <p style="margin:0 0 12px;font-size:14px;color:#fca5a5;">
-              {return_result.get('message') or 'Return failed'}
-            </p>
-            <button onclick="window.location.href='/admin/returns?pin={pin}'"
-                    style="margin-top:8px;padding:12px 18px;border-radius:999px;border:none;background:#1d4ed8;color:#fff;font-size:15px;font-weight:500;width:100%;max-width:260px;cursor:pointer;">
-              ← Back to admin
-            </button>
-          </div>
-        </div>
-      </body>
-    </html>
-    """, status_code=500)
+        return HTMLResponse(templates.admin_result_page("✅ Approved", pin, return_result.get('message') or 'Return approved successfully'))
+
+    return HTMLResponse(templates.admin_result_page("❌ eLibra return failed", pin, return_result.get('message') or 'Return failed', ok=False), status_code=500)
 
 @app.post("/admin/returns/{req_id}/reject", response_class=HTMLResponse)
-def admin_reject(req_id: int, pin: str = Form(...)):
-    if pin != ADMIN_PIN:
-        return HTMLResponse("<h3>403</h3>", status_code=403)
-
-    asyncio.create_task(notify_activity("admin_reject", None, {"req_id": req_id}))
-    with db() as c:
-        c.execute(
-            "UPDATE return_requests SET status='REJECTED', approved_at=?, approved_by=? WHERE id=? AND status='PENDING'",
-            (datetime.datetime.utcnow().isoformat(), "LIBRARIAN", req_id),
+async def admin_reject(req_id: int, pin: str = Form(...)):
+    if not _pin_ok(pin):
+        return _FORBIDDEN
+
+    notify_activity_nowait("admin_reject", None, {"req_id": req_id})
+    async with _write_lock:
+        await asyncio.to_thread(
+            _write_immediate,
+            (SQL_REJECT_RETURN_REQUEST, (_utc_iso(), "LIBRARIAN", req_id)),
         )
-    return HTMLResponse(f"""
-    <html>
-      <head>
-        <meta charset="utf-8"/>
-        <meta name="viewport" content="width=device-width, initial-scale=1"/>
-        <meta name="generator" content="AB2025"/>
-        <!-- AB2025 -->
-      </head>
-      <body style="font-family:system-ui;max-width:480px;margin:40px auto;padding:16px;text-align:center;">
-        <div style="background:#241216;border:1px solid #4b1f25;border-radius:18px;padding:18px;">
-          <h2 style="margin:0 0 8px;font-size:20px;">❌ Rejected</h2>
-          <button onclick="window.location.href='/admin/returns?pin={pin}'"
-                  style="margin-top:8px;padding:12px 18px;border-radius:999px;border:none;background:#1d4ed8;color:#fff;font-size:15px;font-weight:500;width:100%;max-width:260px;cursor:pointer;">
-            ← Back to admin
-          </button>
-        </div>
-      </body>
-    </html>
-    """)
+    return HTMLResponse(templates.admin_result_page("❌ Rejected", pin, ok=False))
 
 @app.get("/admin/search", response_class=HTMLResponse)
-def admin_search(pin: str):
+async def admin_search(pin: str):
     """Admin page for searching readers by name/email (full search functionality)."""
-    if pin != ADMIN_PIN:
-        return HTMLResponse("<h3>403</h3>", status_code=403)
-
-    return HTMLResponse(f"""
-    <html>
-      <head>
-        <meta charset="utf-8"/>
-        <meta name="viewport" content="width=device-width, initial-scale=1"/>
-        <meta name="generator" content="AB2025"/>
-        <!-- AB2025 -->
-        <title>Admin — Search Readers</title>
-        <style>
-          body {{
-            font-family: system-ui, -apple-system, sans-serif;
-            max-width: 900px;
-            margin: 0 auto;
-            padding: 16px;
-            background: #0b0f14;
-            color: #e7edf5;
-          }}
-          h2 {{
-            margin: 8px 0 16px;
-            font-size: 20px;
-            text-align: center;
-          }}
-          .card {{
-            background: #0f1623;
-            border: 1px solid #1f2b40;
-            border-radius: 18px;
-            padding: 18px;
-            margin: 12px 0;
-          }}
-          label {{
-            display: block;
-            font-size: 12px;
-            color: #9fb0c5;
-            margin: 10px 0 6px;
-          }}
-          input, button {{
-            width: 100%;
-            padding: 14px;
-            border-radius: 14px;
-            border: 1px solid #253553;
-            background: #0b1220;
-            color: #e7edf5;
-            font-size: 16px;
-            box-sizing: border-box;
-          }}
-          input::placeholder {{
-            color: #6e7f97;
-          }}
-          button {{
-            cursor: pointer;
-            font-weight: 600;
-            background: #1d4ed8;
-            border: none;
-            margin-top: 8px;
-          }}
-          button:disabled {{
-            opacity: 0.5;
-            cursor: not-allowed;
-          }}
-          button.loading {{
-            position: relative;
-            pointer-events: none;
-          }}
-          button.loading::after {{
-            content: "";
-            position: absolute;
-            left: 50%;
-            top: 50%;
-            transform: translate(-50%, -50%);
-            width: 16px;
-            height: 16px;
-            border: 2px solid rgba(255,255,255,0.3);
-            border-top-color: #fff;
-            border-radius: 50%;
-            animation: spin 0.8s linear infinite;
-          }}
-          @keyframes spin {{
-            to {{ transform: translate(-50%, -50%) rotate(360deg); }}
-          }}
-          .result {{
-            border: 1px solid #253553;
-            background: #0b1220;
-            border-radius: 14px;
-            padding: 12px;
-            margin-top: 10px;
-            cursor: pointer;
-          }}
-          .result:hover {{
-            border-color: #3a547a;
-          }}
-          .small {{
-            font-size: 12px;
-            color: #9fb0c5;
-            margin-top: 4px;
-          }}
-          .status {{
-            margin-top: 12px;
-            font-size: 14px;
-            color: #9fb0c5;
-          }}
-          .status-loading {{
-            color: #9ff3b2;
-            font-weight: 600;
-          }}
-          .back-link {{
-            display: inline-block;
-            margin-top: 16px;
-            color: #9fb0c5;
-            text-decoration: none;
-            font-size: 14px;
-          }}
-          .back-link:hover {{
-            color: #e7edf5;
-          }}
-        </style>
-      </head>
-      <body>
-        <h2>🔍 Search Readers</h2>
-        <div class="card">
-          <label>Поиск читателя (имя / email / cardcode)</label>
-          <input id="readerSearch" placeholder="например: aidar / a.begotayev... / 2100000004099"/>
-          <button type="button" id="btnSearch" onclick="searchReaders()">🔎 Найти</button>
-          <div id="status" class="status"></div>
-          <div id="readerResults"></div>
-        </div>
-        <a href="/admin/returns?pin={pin}" class="back-link">← Back to admin</a>
-      </body>
-      <script>
-        let isSearching = false;
-
-        async function searchReaders(){{
-          if (isSearching) return;
-          
-          const q = (document.getElementById("readerSearch").value || "").trim();
-          if (q.length < 2) {{
-            document.getElementById("status").innerText = "Введите минимум 2 символа";
-            return;
-          }}
-
-          isSearching = true;
-          const btn = document.getElementById("btnSearch");
-          const input = document.getElementById("readerSearch");
-          const status = document.getElementById("status");
-          const results = document.getElementById("readerResults");
-          
-          btn.disabled = true;
-          btn.classList.add("loading");
-          input.disabled = true;
-          status.innerText = "🔎 Ищу читателя…";
-          status.className = "status status-loading";
-          results.innerHTML = "";
-
-          try {{
-            const res = await fetch(`/api/readers/search?q=${{encodeURIComponent(q)}}`);
-            const data = await res.json();
-            const el = data.elibra;
-
-            let readerList = [];
-            if (Array.isArray(el)) readerList = el;
-            else if (el && Array.isArray(el.result)) readerList = el.result;
-            else if (el && Array.isArray(el.results)) readerList = el.results;
-
-            if (!readerList.length) {{
-              status.innerText = "Не найдено";
-              status.className = "status";
-              return;
-            }}
-
-            readerList.slice(0, 25).forEach(item => {{
-              const readerId = item.parentId;
-              const fm = (item.fieldModels || []);
-              const getByCode = (code) => {{
-                const f = fm.find(x => x.code === code);
-                return f ? f.value : "";
-              }};
-
-              const first = getByCode("FIRST_NAME");
-              const last = getByCode("LAST_NAME");
-              const email = getByCode("EMAIL");
-              const card = getByCode("LIBRARY_CARD_BARCODE");
-
-              const div = document.createElement("div");
-              div.className = "result";
-              div.innerHTML = `
-                <b>${{(first||"")}} ${{(last||"")}}</b>
-                <div class="small">reader_id: <b>${{readerId}}</b> • card: ${{card || "-"}}</div>
-                <div class="small">${{email || ""}}</div>
-              `;
-              results.appendChild(div);
-            }});
-
-            status.innerText = `Найдено: ${{readerList.length}} читателей`;
-            status.className = "status";
-          }} catch (error) {{
-            status.innerText = "Ошибка при поиске. Попробуйте ещё раз.";
-            status.className = "status";
-            console.error("Search error:", error);
-          }} finally {{
-            isSearching = false;
-            btn.disabled = false;
-            btn.classList.remove("loading");
-            input.disabled = false;
-          }}
-        }}
-
-        document.getElementById("readerSearch").addEventListener("keydown", (e) => {{
-          if (e.key === "Enter") {{
-            e.preventDefault();
-            searchReaders();
-          }}
-        }});
-      </script>
-    </html>
-    """)
+    if not _pin_ok(pin):
+        return _FORBIDDEN
+
+    return HTMLResponse(templates.ADMIN_SEARCH.render(pin=pin))
+
+STATS_PAGE_SIZE = 20
+# Template output pieces grouped per streamed chunk
+STATS_STREAM_BUFFER = 32
+_FIRST_PAGE_CURSOR = (1 << 63) - 1  # above any SQLite rowid
+_STATS_PAGES = {
+    "issued": (SQL_SELECT_ISSUED_PAGE, "STATS_ISSUED_CARD", "book"),
+    "returns": (SQL_SELECT_RETURNS_PAGE, "STATS_RETURN_CARD", "ret"),
+}
+
+def _load_stats():
+    """Blocking: all /admin/stats reads on the read-only connection, run via asyncio.to_thread."""
+    c = db_ro()
+    # Статистика
+    total_issued, total_approved, total_pending, total_rejected, total_returns = c.execute(SQL_STATS_TOTALS).fetchone()
+
+    # Первая страница списков, остальное подгружается через /admin/stats/more
+    issued_books = c.execute(SQL_SELECT_ISSUED_PAGE, (_FIRST_PAGE_CURSOR, STATS_PAGE_SIZE)).fetchall()
+    all_returns = c.execute(SQL_SELECT_RETURNS_PAGE, (_FIRST_PAGE_CURSOR, STATS_PAGE_SIZE)).fetchall()
+    return total_issued, total_approved, total_pending, total_rejected, total_returns, issued_books, all_returns
+
+def _next_cursor(rows: list) -> Optional[int]:
+    """Cursor for the next page, or None when this page was the last one."""
+    return rows[-1]["id"] if len(rows) == STATS_PAGE_SIZE else None
+
+# Only requests that pass _pin_ok() get the page, so the pin in the head is always ADMIN_PIN
+_STATS_BACK_HREF = f"/admin/returns?pin={ADMIN_PIN}"
+_STATS_HEAD = templates.ADMIN_STATS_HEAD.render(back_href=_STATS_BACK_HREF)
 
 @app.get("/admin/stats", response_class=HTMLResponse)
-def admin_stats(pin: str):
+async def admin_stats(request: Request, pin: str):
     """Admin statistics page: shows issued books, return requests, and overall stats."""
-    if pin != ADMIN_PIN:
-        return HTMLResponse("<h3>403</h3>", status_code=403)
-    
-    with db() as c:
-        # Статистика
-        total_issued = c.execute("SELECT COUNT(*) as cnt FROM issued_books").fetchone()["cnt"]
-        total_approved = c.execute("SELECT COUNT(*) as cnt FROM return_requests WHERE status='APPROVED'").fetchone()["cnt"]
-        total_pending = c.execute("SELECT COUNT(*) as cnt FROM return_requests WHERE status='PENDING'").fetchone()["cnt"]
-        total_rejected = c.execute("SELECT COUNT(*) as cnt FROM return_requests WHERE status='REJECTED'").fetchone()["cnt"]
-        
-        # Последние выданные книги (50 последних)
-        issued_books = c.execute(
-            "SELECT * FROM issued_books ORDER BY issued_at DESC LIMIT 50"
-        ).fetchall()
-        
-        # Все заявки на возврат (последние 100)
-        all_returns = c.execute(
-            "SELECT * FROM return_requests ORDER BY created_at DESC LIMIT 100"
-        ).fetchall()
-    
-    issued_html = ""
-    for book in issued_books:
-        issued_html += f"""
-        <div class="card">
-          <div class="card-header">
-            <b>#{book['id']}</b>
-            <span class="pill-id">{book['barcode']}</span>
-          </div>
-          <div class="row-small">Reader ID: <code>{book['reader_id'] or ""}</code></div>
-          <div class="row-small">Card: <code>{book['card_barcode'] or ""}</code></div>
-          <div class="row-small">Loan days: {book['loan_days']}</div>
-          <div class="row-small">Issued: {book['issued_at']}</div>
-        </div>
-        """
-    
-    returns_html = ""
-    for ret in all_returns:
-        status_color = {
-            "PENDING": "#f59e0b",
-            "APPROVED": "#16a34a",
-            "REJECTED": "#dc2626"
-        }.get(ret["status"], "#666")
-        
-        returns_html += f"""
-        <div class="card">
-          <div class="card-header">
-            <b>Request #{ret['id']}</b>
-            <span class="pill-id">{ret['barcode']}</span>
-            <span style="padding:2px 8px;border-radius:999px;background:{status_color};color:#fff;font-size:11px;">
-              {ret['status']}
-            </span>
-          </div>
-          <div class="row-small">Reader ID: <code>{ret['reader_id'] or ""}</code></div>
-          <div class="row-small">Created: {ret['created_at']}</div>
-          {f"<div class='row-small'>Approved: {ret['approved_at']}</div>" if ret['approved_at'] else ""}
-        </div>
-        """
+    if not _pin_ok(pin):
+        return _FORBIDDEN
     
-    return HTMLResponse(f"""
-    <html>
-      <head>
-        <meta charset="utf-8"/>
-        <meta name="viewport" content="width=device-width, initial-scale=1, maximum-scale=1"/>
-        <meta name="generator" content="AB2025"/>
-        <!-- AB2025 -->
-        <title>Admin - Statistics</title>
-        <style>
-          body {{
-            font-family: system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-            max-width: 900px;
-            margin: 0 auto;
-            padding: 16px;
-            background: #f5f5f5;
-          }}
-          .header {{
-            text-align: center;
-            margin-bottom: 20px;
-          }}
-          h1 {{
-            margin: 8px 0;
-            font-size: 24px;
-          }}
-          .stats-grid {{
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(150px, 1fr));
-            gap: 12px;
-            margin-bottom: 24px;
-          }}
-          .stat-card {{
-            background: #fff;
-            border-radius: 12px;
-            padding: 16px;
-            text-align: center;
-            box-shadow: 0 1px 3px rgba(0,0,0,0.06);
-          }}
-          .stat-value {{
-            font-size: 32px;
-            font-weight: 700;
-            margin: 8px 0;
-          }}
-          .stat-label {{
-            font-size: 13px;
-            color: #666;
-          }}
-          .section {{
-            margin: 24px 0;
-          }}
-          .section-title {{
-            font-size: 18px;
-            font-weight: 600;
-            margin-bottom: 12px;
-            padding-bottom: 8px;
-            border-bottom: 2px solid #e5e7eb;
-          }}
-          .card {{
-            border-radius: 14px;
-            padding: 12px 14px;
-            margin: 10px 0;
-            background: #fff;
-            box-shadow: 0 1px 3px rgba(0,0,0,0.06);
-          }}
-          .card-header {{
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 6px;
-            font-size: 14px;
-            gap: 8px;
-            flex-wrap: wrap;
-          }}
-          .card-header b {{
-            font-size: 15px;
-          }}
-          .pill-id {{
-            padding: 2px 8px;
-            border-radius: 999px;
-            background: #eef2ff;
-            font-size: 12px;
-          }}
-          .row-small {{
-            font-size: 13px;
-            margin: 2px 0;
-            word-break: break-all;
-          }}
-          .back-link {{
-            display: inline-block;
-            margin-top: 16px;
-            padding: 8px 16px;
-            background: #1d4ed8;
-            color: #fff;
-            text-decoration: none;
-            border-radius: 999px;
-            font-size: 14px;
-          }}
-          @media (max-width: 480px) {{
-            body {{
-              padding: 12px;
-            }}
-            .stats-grid {{
-              grid-template-columns: repeat(2, 1fr);
-            }}
-          }}
-        </style>
-      </head>
-      <body>
-        <div class="header">
-          <h1>📊 Статистика системы</h1>
-          <a href="/admin/returns?pin={pin}" class="back-link">← Back to pending returns</a>
-        </div>
-        
-        <div class="stats-grid">
-          <div class="stat-card">
-            <div class="stat-value" style="color:#16a34a;">{total_issued}</div>
-            <div class="stat-label">Выдано книг</div>
-          </div>
-          <div class="stat-card">
-            <div class="stat-value" style="color:#16a34a;">{total_approved}</div>
-            <div class="stat-label">Возвращено</div>
-          </div>
-          <div class="stat-card">
-            <div class="stat-value" style="color:#f59e0b;">{total_pending}</div>
-            <div class="stat-label">Ожидают возврата</div>
-          </div>
-          <div class="stat-card">
-            <div class="stat-value" style="color:#dc2626;">{total_rejected}</div>
-            <div class="stat-label">Отклонено</div>
-          </div>
-        </div>
-        
-        <div class="section">
-          <div class="section-title">📚 Последние выданные книги ({len(issued_books)})</div>
-          {issued_html if issued_books else "<p style='text-align:center;color:#666;'>Нет выданных книг</p>"}
-        </div>
-        
-        <div class="section">
-          <div class="section-title">↩️ Все заявки на возврат ({len(all_returns)})</div>
-          {returns_html if all_returns else "<p style='text-align:center;color:#666;'>Нет заявок</p>"}
-        </div>
-        
-        <div style="text-align:center;margin-top:32px;">
-          <a href="/admin/returns?pin={pin}" class="back-link">← Back to pending returns</a>
-        </div>
-      </body>
-    </html>
-    """)
+    # data_version changes whenever any other connection (this process or another worker)
+    # commits, so an unchanged value means the cached page is still exact
+    version, etag = await _admin_etag()
+    if request.headers.get("if-none-match") == etag:
+        return _NOT_MODIFIED
+    headers = {"ETag": etag, "Cache-Control": _ADMIN_CACHE_CONTROL}
+    key = version, pin
+    html = _stats_page_cache.get(key)
+    if html is not None:
+        return HTMLResponse(html, headers=headers)
+
+    async def page():
+        # The head goes out before the queries run; the rest is streamed as it renders
+        parts = [_STATS_HEAD]
+        yield _STATS_HEAD
+        total_issued, total_approved, total_pending, total_rejected, total_returns, issued_books, all_returns = await asyncio.to_thread(_load_stats)
+        stream = templates.ADMIN_STATS.stream(
+            pin=pin,
+            back_href=_STATS_BACK_HREF,
+            kpis=[
+                ("good", total_issued, "Выдано книг"),
+                ("good", total_approved, "Возвращено"),
+                ("warn", total_pending, "Ожидают возврата"),
+                ("bad", total_rejected, "Отклонено"),
+            ],
+            total_issued=total_issued,
+            total_returns=total_returns,
+            issued_books=issued_books,
+            all_returns=all_returns,
+            issued_cursor=_next_cursor(issued_books),
+            returns_cursor=_next_cursor(all_returns),
+        )
+        stream.enable_buffering(STATS_STREAM_BUFFER)
+        # Rendering runs in the threadpool so a long page doesn't stall the event loop
+        async for chunk in iterate_in_threadpool(stream):
+            parts.append(chunk)
+            yield chunk
+        _stats_page_cache.set(key, "".join(parts))
+
+    return StreamingResponse(page(), media_type="text/html; charset=utf-8", headers=headers)
+
+@app.get("/admin/stats/more")
+async def admin_stats_more(pin: str, kind: str, cursor: int):
+    """Next page of /admin/stats cards (kind=issued|returns), as HTML plus the following cursor."""
+    if not _pin_ok(pin):
+        return JSONResponse({"error": "forbidden"}, status_code=403)
+    page = _STATS_PAGES.get(kind)
+    if page is None:
+        return JSONResponse({"error": "unknown kind"}, status_code=400)
+    sql, template_name, var = page
+    rows = await _ro_fetchall(sql, (cursor, STATS_PAGE_SIZE))
+    card = getattr(templates, template_name)
+    return {
+        "html": "".join(card.render({var: row}) for row in rows),
+        "next_cursor": _next_cursor(rows),
+    }
@@ -1,13 +1,26 @@
-from pydantic import BaseModel, Field
+from typing import Annotated, Literal
+
+from pydantic import BaseModel, ConfigDict, StringConstraints
+
+# Validated by pydantic-core; frozen instances are hashable, unknown keys are rejected
+_REQUEST_CONFIG = ConfigDict(frozen=True, str_strip_whitespace=True, extra="forbid")
+
+# Shared constrained types, so every model reuses the same core schema
+Barcode = Annotated[str, StringConstraints(min_length=3)]
+StudentId = Annotated[str, StringConstraints(min_length=1)]
 
 class ReturnRequest(BaseModel):
-    barcode: str = Field(..., min_length=3)
+    model_config = _REQUEST_CONFIG
+    barcode: Barcode
 
 class IssueRequest(BaseModel):
-    barcode: str = Field(..., min_length=3)
-    student_id: str = Field(..., min_length=1)
+    model_config = _REQUEST_CONFIG
+    barcode: Barcode
+    student_id: StudentId
 
 class UiSubmitRequest(BaseModel):
+    # Left unconstrained, like the /submit form fields it mirrors
+    model_config = _REQUEST_CONFIG
     barcode: str
     student_id: str | None = None
-    action: str  # "issue" or "return"
+    action: Literal["issue", "return"]
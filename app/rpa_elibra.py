@@ -1,11 +1,22 @@
 _DEV_SIGNATURE = "AB2025"
 import asyncio
+import functools
+import json
 import logging
 import re
+import sys
+import time
 from typing import Optional, Dict, Any
 from pathlib import Path
+from urllib.parse import unquote_plus
 
-from playwright.async_api import async_playwright, BrowserContext, Page, Playwright, TimeoutError as PlaywrightTimeoutError
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+from playwright.async_api import async_playwright, BrowserContext, Locator, Page, Playwright, TimeoutError as PlaywrightTimeoutError
 
 from app.settings import settings
 
@@ -13,24 +24,303 @@ logger = logging.getLogger(__name__)
 
 BASE_URL = settings.elibra_base_url
 ISSUANCE_URL = f"{BASE_URL}/workspace/issuance"
-LOGIN_URL = f"{BASE_URL}/auth/login"
+LOGIN_PATH = "/auth/login"
+LOGIN_URL = f"{BASE_URL}{LOGIN_PATH}"
 USER_DATA_DIR = Path("pw_profile").absolute()
+# health() reports logged_in if the issuance workspace was reached this recently (seconds)
+LOGIN_OK_TTL = 300
+
+# Only flags Playwright does not already pass. Background networking, extensions, Translate,
+# MediaRouter etc. are off by default; Chromium keeps just the last --disable-features /
+# --blink-settings switch, so repeating those here would replace Playwright's lists.
+_CHROMIUM_FLAGS = (
+    "--disable-blink-features=AutomationControlled",
+    "--mute-audio",
+    "--disk-cache-size=33554432",
+)
+# Nobody looks at a headless window, so skip GPU setup there
+_CHROMIUM_HEADLESS_FLAGS = (
+    "--disable-gpu",
+)
+
+# Static assets the RPA never needs, blocked inside Chromium (CDP Network.setBlockedURLs).
+# Unlike context.route(), this keeps the HTTP cache on, so the SPA's JS/CSS bundles are not
+# refetched on every goto. Stylesheets stay: visibility checks on modals and dropdowns depend on them.
+_BLOCKED_ASSET_URLS = tuple(
+    f"*.{ext}{suffix}"
+    for ext in ("woff", "woff2", "ttf", "otf", "eot", "mp4", "webm", "mp3", "ogg", "wav")
+    for suffix in ("", "?*")
+)
+# Headless only: a visible window is also used for /rpa/manual-login
+_BLOCKED_IMAGE_URLS = tuple(
+    f"*.{ext}{suffix}"
+    for ext in ("png", "jpg", "jpeg", "gif", "webp", "ico", "bmp")
+    for suffix in ("", "?*")
+)
+
+# Compiled once at import instead of on every login / search result
+_LOGIN_BUTTON_RE = re.compile("Sign in|Log in|Login|Войти", re.I)
+_ONCLICK_READER_ID_RE = re.compile(r'readerId[=:](\d+)')
+
+# Login form fields as one selector union each, so Playwright probes all candidates in a single wait
+_EMAIL_CSS = "input[type='email'], input[name='email'], input[name*='username'], input[placeholder*='mail' i]"
+_PASSWORD_CSS = "input[type='password'], input[name='password']"
+_LOGIN_SUBMIT_CSS = "button[type='submit']"
+
+# Fixed selector / URL tables, built once instead of on every call (or every intercepted response)
+# Reader search API (old API: POST /api/interface-service/issuance/action/reader/profile/list/4?searchValue=...,
+# newer builds: .../reader/search)
+_SEARCH_URL_RE = re.compile(r"/api/interface-service/issuance/action/reader/(?:profile/list|search)(?:[/?#]|$)")
+# Reader profile requests fired when a search result is clicked; they carry the readerId
+_READER_PROFILE_PATH = "/api/interface-service/issuance/action/reader/profile/"
+# Rendered search results that may carry the reader id in their attributes
+_RESULT_ITEMS_CSS = "[data-reader-id], [data-id], .reader-item, .search-result-item"
+# [data-reader-id or data-id, onclick] of the first `limit` result elements
+_RESULT_ITEM_ATTRS_JS = """([css, limit]) => Array.from(document.querySelectorAll(css))
+    .slice(0, limit)
+    .map(el => [el.getAttribute('data-reader-id') || el.getAttribute('data-id'), el.getAttribute('onclick')])"""
+_RESULT_CLICK_CSS = "[role='option'], .result, [data-reader-id]"
+_RESULT_ELEMENT_SELECTORS = (
+    ".result", "[role='option']", ".reader-item",
+    ".search-result", "[data-reader-id]", "[data-id]",
+    "div[class*='result']", "div[class*='item']", "li[class*='result']",
+)
+# Keys under which the search API may wrap its result list
+_RESULT_LIST_KEYS = ("result", "results", "data", "items", "list")
+_ISSUE_MODAL_SELECTORS = (
+    "[role='dialog']",
+    ".modal",
+    ".dialog",
+    "[class*='modal']",
+    "[class*='dialog']",
+    "div:has-text('issuance-book')",
+)
+_DATE_INPUT_SELECTORS = (
+    "input[placeholder*='дату']",
+    "input[placeholder*='date']",
+    "input[placeholder*='Выберите']",
+    "input[label*='return-date']",
+    "input[label*='return date']",
+    "input[name*='return']",
+    "input[name*='date']",
+    "input[type='date']",
+    "input[type='text']",  # Some date pickers use text input
+)
+# Same selectors as one :visible union, for a single wait instead of a probe per selector
+_ISSUE_MODAL_CSS = ", ".join(f"{sel}:visible" for sel in _ISSUE_MODAL_SELECTORS)
+_ISSUANCE_TAB_CHECKED_CSS = "label.ant-radio-button-wrapper-checked:has-text('Issuance')"
+_RETURN_TAB_CHECKED_CSS = "label.ant-radio-button-wrapper-checked:has-text('Return')"
+# Reader-selection checks for _verify_reader_selected, in order:
+# 1. "Select a reader" warning shown -> NOT selected
+# 2. Ant Design card with descriptions and a "Card barcode" / "First Name" label
+# 3. Card title (reader name) with some text
+# 4. Descriptions table with at least 3 rows of reader data
+_READER_SELECTED_JS = """() => {
+    const shown = el => el && el.getClientRects().length > 0;
+    if (/Select a reader/i.test(document.body.innerText)) return "warning";
+    for (const card of document.querySelectorAll(".ant-card")) {
+        if (shown(card) && card.querySelector(".ant-descriptions") && /Card barcode|First Name/i.test(card.innerText))
+            return "found Ant Design card with reader labels";
+    }
+    const title = document.querySelector(".ant-card-head-title h4");
+    if (shown(title) && title.innerText.trim().length > 2)
+        return "found card title: " + title.innerText.trim().slice(0, 30);
+    const table = document.querySelector(".ant-descriptions table");
+    if (shown(table) && table.querySelectorAll("tbody tr").length >= 3)
+        return "found rows in descriptions table";
+    return null;
+}"""
+# Resolves once _READER_SELECTED_JS reports a selected reader (polled, see _wait_for_reader_selected)
+_READER_SELECTED_WAIT_JS = f"""() => {{
+    const reason = ({_READER_SELECTED_JS})();
+    return !!reason && reason !== "warning";
+}}"""
+_OPEN_DROPDOWN_CSS = ".ant-select-dropdown:not(.ant-select-dropdown-hidden)"
+_ISSUE_API_PATH = "/api/interface-service/issuance/action/issue/book/item"
+_RETURN_API_PATH = "/api/interface-service/issuance/action/return/book/item"
+_ISSUANCE_BUTTON_SELECTORS = (
+    "button:has-text('Issuance')",
+    "button[type='submit']",
+    "[role='button']:has-text('Issuance')",
+)
+# Any visible Issuance button that is not the tab (tabs carry aria-selected)
+_ISSUANCE_BUTTON_CSS = ", ".join(f"{sel}:not([aria-selected]):visible" for sel in _ISSUANCE_BUTTON_SELECTORS)
+# Toasts / messages the UI shows once an issue or return has been processed
+_OUTCOME_INDICATOR_CSS = (
+    ".error:visible, .toast-error:visible, .success:visible, .toast-success:visible, "
+    ":text-matches('error|failed|success|issued|completed', 'i'):visible"
+)
+_MODAL_CLOSE_SELECTORS = (
+    "[role='dialog'] button[aria-label*='close' i]",
+    "[role='dialog'] button[aria-label*='Close' i]",
+    "[role='dialog'] .ant-modal-close",
+    "[role='dialog'] button:has-text('Close')",
+    "[role='dialog'] button:has-text('×')",
+    ".ant-modal-close",
+    ".ant-modal button[aria-label='Close']",
+)
+_WARNING_MODAL_SELECTORS = (
+    ".ant-modal-confirm:has-text('Warning')",
+    ".ant-modal-confirm:has-text('The book is given to another reader')",
+    ".ant-modal-confirm:has-text('given to another reader')",
+    "[role='dialog'].ant-modal-confirm",
+    ".ant-modal.ant-modal-confirm",
+    "[role='dialog'][aria-modal='true'].ant-modal-confirm",
+)
+_WARNING_MODAL_CSS = ", ".join(f"{sel}:visible" for sel in _WARNING_MODAL_SELECTORS)
+# "The book is given to another reader. Are you sure you want to return the book?"
+_WARNING_MODAL_TEXT_RE = re.compile(r"given to another reader|warning[\s\S]*book|book[\s\S]*warning", re.I)
+
+
+def _is_search_response(response, query: str) -> bool:
+    """JSON reader-list response for this query, not one fired for a cleared or stale input."""
+    if not (
+        response.ok
+        and _SEARCH_URL_RE.search(response.url) is not None
+        and "json" in response.headers.get("content-type", "")
+    ):
+        return False
+    request = response.request
+    return query in unquote_plus(request.url) or query in (request.post_data or "")
+
+
+def _is_issue_response(response) -> bool:
+    return _ISSUE_API_PATH in response.url
+
+
+def _is_return_response(response) -> bool:
+    return _RETURN_API_PATH in response.url
+
+
+def _is_reader_profile_response(response) -> bool:
+    return _READER_PROFILE_PATH in response.url
+
+
+def _matching_option_css(query: str) -> str:
+    """
+    Visible reader dropdown options whose text or title contains the (lowercased) query.
+    :has-text() is case-insensitive; :visible skips Ant Design's zero-size a11y listbox.
+    Для card_barcode ожидаем точное вхождение строки, для имени – тоже ищем подстроку
+    """
+    q = json.dumps(query, ensure_ascii=False)
+    return f"[role='option']:has-text({q}):visible, [role='option'][title*={q} i]:visible"
+
+
+def _parse_search_results(data) -> list:
+    """Result list out of a search API response, with parentId filled in where the API names it differently."""
+    results = []
+    if isinstance(data, list):
+        results = data
+    elif isinstance(data, dict):
+        # Try various possible keys
+        for key in _RESULT_LIST_KEYS:
+            if key in data and isinstance(data[key], list):
+                results = data[key]
+                break
+    
+    # Log first result structure for debugging
+    if results:
+        logger.debug(f"First result keys: {list(results[0].keys()) if isinstance(results[0], dict) else 'not dict'}")
+    
+    # Check if results already have parentId/readerId/id
+    for result in results:
+        if isinstance(result, dict) and not result.get("parentId"):
+            # Try different field names for reader_id
+            rid = result.get("readerId") or result.get("id") or result.get("reader_id")
+            if rid is not None:
+                result["parentId"] = rid
+    return results
+
+
+async def _reader_id_from_profile(response) -> Optional[int]:
+    """readerId of a reader profile call: from the request URL or payload, else from the response body."""
+    request = response.request
+    try:
+        if "readerId=" in request.url:
+            return int(request.url.split("readerId=")[1].split("&")[0])
+        post_data = request.post_data
+        if post_data:
+            try:
+                payload = _json_loads(post_data)
+                if isinstance(payload, dict) and "readerId" in payload:
+                    return int(payload["readerId"])
+            except ValueError:
+                # Try URL-encoded format
+                if "readerId=" in post_data:
+                    return int(post_data.split("readerId=")[1].split("&")[0])
+    except (ValueError, TypeError):
+        pass
+    try:
+        resp_data = _json_loads(await response.body())
+        if isinstance(resp_data, dict):
+            if "readerId" in resp_data:
+                return int(resp_data["readerId"])
+            elif "id" in resp_data:
+                return int(resp_data["id"])
+    except Exception:
+        pass
+    return None
+
+
+@functools.lru_cache(maxsize=1)
+def _verify_event_loop() -> None:
+    """
+    Fail fast if Playwright can't spawn its driver on this event loop (SelectorEventLoop on Windows).
+    The policy itself is chosen at import in app.main (winloop, else Proactor); this only catches
+    runners that created their own loop before that. Runs once per process.
+    """
+    if sys.platform != "win32":
+        return
+    try:
+        loop = asyncio.get_running_loop()
+        loop_type = type(loop).__name__
+        logger.info(f"Current event loop type: {loop_type}")
+        
+        if isinstance(loop, asyncio.SelectorEventLoop):
+            policy = asyncio.get_event_loop_policy()
+            error_msg = (
+                f"ERROR: Event loop is {loop_type}, but Playwright requires ProactorEventLoop on Windows.\n"
+                f"Current loop policy: {type(policy).__name__}\n"
+                f"\n"
+                f"This usually happens when:\n"
+                f"  1. Running uvicorn directly (not via run_windows.py)\n"
+                f"  2. Using --reload flag on Windows (uvicorn reloader creates child processes)\n"
+                f"\n"
+                f"Solution:\n"
+                f"  - Use 'python run_windows.py' (reload is disabled by default on Windows)\n"
+                f"  - If you need reload, restart manually after code changes\n"
+                f"  - Or use 'python run_windows.py --reload' and accept potential issues\n"
+            )
+            logger.error(error_msg)
+            raise RuntimeError(error_msg)
+    except RuntimeError:
+        raise  # Re-raise our custom error
+    except Exception as e:
+        logger.warning(f"Could not verify event loop type: {e}")
 
 
 class ElibraRPA:
     """
     RPA client for eLibra using Playwright.
     Uses persistent browser context to maintain login session.
-    Thread-safe: uses asyncio.Lock() to serialize all RPA operations.
+    Thread-safe: operations on the main tab are serialized by one asyncio.Lock();
+    reader searches run on their own tab under a separate lock.
     """
     
     def __init__(self):
         self.playwright: Optional[Playwright] = None
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
-        self._lock = asyncio.Lock()
+        # Separate tab for search_readers, so searches don't queue behind issue/return on self.page
+        self._search_page: Optional[Page] = None
+        self._search_inputs: Dict[Page, Locator] = {}
+        self._blocked_urls: tuple = _BLOCKED_ASSET_URLS
+        self._init_lock = asyncio.Lock()  # initialize() / close() only
+        self._lock = asyncio.Lock()  # operations on self.page
+        self._search_lock = asyncio.Lock()  # operations on self._search_page
         self._initialized = False
-        self._logging_in = False
+        self._login_done: Optional[asyncio.Event] = None  # Unset while an auto-login is running
+        self._last_login_ok_at = 0.0  # time.monotonic() of the last successful _ensure_issuance_page
         
     async def initialize(self, headless: bool = False):
         """
@@ -40,38 +330,11 @@ class ElibraRPA:
         """
         if self._initialized:
             return
-        async with self._lock:
+        async with self._init_lock:
             if self._initialized:
                 return
-            import platform
-            if platform.system() == "Windows":
-                try:
-                    loop = asyncio.get_running_loop()
-                    loop_type = type(loop).__name__
-                    logger.info(f"Current event loop type: {loop_type}")
-                    
-                    if "Selector" in loop_type:
-                        policy = asyncio.get_event_loop_policy()
-                        error_msg = (
-                            f"ERROR: Event loop is {loop_type}, but Playwright requires ProactorEventLoop on Windows.\n"
-                            f"Current loop policy: {type(policy).__name__}\n"
-                            f"\n"
-                            f"This usually happens when:\n"
-                            f"  1. Running uvicorn directly (not via run_windows.py)\n"
-                            f"  2. Using --reload flag on Windows (uvicorn reloader creates child processes)\n"
-                            f"\n"
-                            f"Solution:\n"
-                            f"  - Use 'python run_windows.py' (reload is disabled by default on Windows)\n"
-                            f"  - If you need reload, restart manually after code changes\n"
-                            f"  - Or use 'python run_windows.py --reload' and accept potential issues\n"
-                        )
-                        logger.error(error_msg)
-                        raise RuntimeError(error_msg)
-                except RuntimeError:
-                    raise  # Re-raise our custom error
-                except Exception as e:
-                    logger.warning(f"Could not verify event loop type: {e}")
-                
+            _verify_event_loop()
+
             try:
                 logger.info("Initializing Playwright RPA...")
                 self.playwright = await async_playwright().start()
@@ -79,16 +342,18 @@ class ElibraRPA:
                 self.context = await self.playwright.chromium.launch_persistent_context(
                     user_data_dir=str(USER_DATA_DIR),
                     headless=headless,
-                    args=[
-                        "--disable-blink-features=AutomationControlled",
-                    ],
+                    args=[*_CHROMIUM_FLAGS, *(_CHROMIUM_HEADLESS_FLAGS if headless else ())],
+                    ignore_default_args=["--enable-automation"],
                 )
                 
+                self._blocked_urls = _BLOCKED_ASSET_URLS + (_BLOCKED_IMAGE_URLS if headless else ())
+                
                 # Get or create a page
                 if self.context.pages:
                     self.page = self.context.pages[0]
+                    await self._block_assets(self.page)
                 else:
-                    self.page = await self.context.new_page()
+                    self.page = await self._new_page()
                     
                 self._initialized = True
                 logger.info("Playwright RPA initialized")
@@ -112,7 +377,7 @@ class ElibraRPA:
         
     async def close(self):
         """Close browser context and playwright."""
-        async with self._lock:
+        async with self._init_lock, self._lock, self._search_lock:
             if self.context:
                 await self.context.close()
                 self.context = None
@@ -120,13 +385,15 @@ class ElibraRPA:
                 await self.playwright.stop()
                 self.playwright = None
             self.page = None
+            self._search_page = None
+            self._search_inputs.clear()
             self._initialized = False
             logger.info("Playwright RPA closed")
     
     async def _ensure_initialized(self):
         """
         Ensure RPA is initialized, try to initialize if not.
-        Note: This should be called BEFORE acquiring self._lock to avoid deadlock.
+        Initialization has its own lock, so this is safe with or without self._lock held.
         """
         if not self._initialized:
             logger.warning("RPA not initialized, attempting to initialize now...")
@@ -138,136 +405,120 @@ class ElibraRPA:
         """Ensure we have a valid page."""
         await self._ensure_initialized()
         if not self.page or self.page.is_closed():
-            if self.context:
-                self.page = await self.context.new_page()
-            else:
-                raise RuntimeError("Browser context lost")
+            self.page = await self._new_page()
+    
+    async def _ensure_search_page(self) -> Page:
+        """Ensure the search_readers tab exists; it shares the login session via the context."""
+        await self._ensure_initialized()
+        if not self._search_page or self._search_page.is_closed():
+            self._search_page = await self._new_page()
+        return self._search_page
+    
+    async def _new_page(self) -> Page:
+        if not self.context:
+            raise RuntimeError("Browser context lost")
+        # Drop cached locators of pages that have gone away
+        for page in [p for p in self._search_inputs if p.is_closed()]:
+            del self._search_inputs[page]
+        page = await self.context.new_page()
+        await self._block_assets(page)
+        return page
+    
+    async def _block_assets(self, page: Page) -> None:
+        """Have Chromium drop _blocked_urls for this tab; failures only cost bandwidth."""
+        try:
+            session = await self.context.new_cdp_session(page)
+            await session.send("Network.enable")
+            await session.send("Network.setBlockedURLs", {"urls": list(self._blocked_urls)})
+        except Exception as e:
+            logger.debug(f"Could not set blocked URLs: {e}")
     
-    async def _auto_login_if_needed(self) -> None:
+    def _search_input_locator(self, page: Page) -> Locator:
+        """The issuance "Search user" input; built once per page instead of on every call."""
+        locator = self._search_inputs.get(page)
+        if locator is None:
+            locator = self._search_inputs[page] = page.get_by_placeholder("Search user").first
+        return locator
+
+    async def _auto_login_if_needed(self, page: Optional[Page] = None) -> None:
         """
         If we are on /auth/login and credentials are configured, perform auto-login.
         This is best-effort: on failure we raise a clear error so caller can surface it to the user.
+        `page` defaults to self.page.
         """
-        await self._ensure_page()
-        url = self.page.url or ""
+        if page is None:
+            await self._ensure_page()
+            page = self.page
+        url = page.url or ""
 
         # Quick check: only attempt if we're clearly on login page
-        if "/auth/login" not in url:
+        if LOGIN_PATH not in url:
             return
 
-        if self._logging_in:
+        if self._login_done is not None and not self._login_done.is_set():
             logger.info("Auto-login already in progress, waiting for it to finish...")
-            for i in range(40):  # wait up to ~40 seconds
-                await asyncio.sleep(1)
-                current = self.page.url or ""
-                if "/auth/login" not in current:
-                    logger.info("Existing auto-login finished, continuing")
-                    return
-            raise RuntimeError(
-                "Auto-login is still in progress but did not complete in time. "
-                "Please try the operation again or use /rpa/manual-login."
-            )
+            try:
+                await asyncio.wait_for(self._login_done.wait(), timeout=40)
+            except asyncio.TimeoutError:
+                raise RuntimeError(
+                    "Auto-login is still in progress but did not complete in time. "
+                    "Please try the operation again or use /rpa/manual-login."
+                )
+            # The login may have run on the other tab; the session is shared, so the
+            # caller's next navigation lands logged in
+            logger.info("Existing auto-login finished, continuing")
+            return
 
-        if not settings.elibra_user_email or not settings.elibra_password:
+        email_value = settings.elibra_user_email
+        password_value = settings.elibra_password
+        if not email_value or not password_value:
             raise RuntimeError(
                 "eLibra session expired and auto-login is not configured. "
                 "Set ELIBRA_USER_EMAIL / ELIBRA_PASSWORD (or user_email/password) in .env "
                 "or use /rpa/manual-login to log in manually."
             )
 
-        self._logging_in = True
+        self._login_done = asyncio.Event()
         try:
             logger.info("Attempting auto-login on eLibra /auth/login...")
 
             if LOGIN_URL not in url:
                 logger.info(f"Navigating to login page: {LOGIN_URL} (current: {url})")
-                await self.page.goto(LOGIN_URL, wait_until="networkidle", timeout=30000)
-
-            email_value = settings.elibra_user_email
-            password_value = settings.elibra_password
-            email_field = None
-            email_selectors = [
-                ("get_by_placeholder", "E-mail", {}),
-                ("get_by_placeholder", "Email", {}),
-                ("get_by_placeholder", "E-mail address", {}),
-                ("get_by_label", "E-mail", {}),
-                ("get_by_label", "Email", {}),
-                ("locator", "input[type='email']", {}),
-                ("locator", "input[name='email']", {}),
-                ("locator", "input[name*='username']", {}),
-            ]
-            for method, selector, kwargs in email_selectors:
+                # networkidle never settles reliably on the eLibra SPA; wait for the login form instead
+                await page.goto(LOGIN_URL, wait_until="domcontentloaded", timeout=30000)
                 try:
-                    if method == "get_by_placeholder":
-                        candidate = self.page.get_by_placeholder(selector).first
-                    elif method == "get_by_label":
-                        candidate = self.page.get_by_label(selector).first
-                    else:
-                        candidate = self.page.locator(selector).first
-                    if await candidate.is_visible(timeout=1500):
-                        email_field = candidate
-                        logger.info(f"Found email field using {method}: {selector}")
-                        break
-                except Exception:
-                    continue
+                    await page.locator(_PASSWORD_CSS).first.wait_for(state="visible", timeout=15000)
+                except PlaywrightTimeoutError:
+                    logger.warning("Login form did not become visible, probing fields anyway")
 
-            if not email_field:
+            email_field = page.locator(_EMAIL_CSS).first
+            try:
+                await email_field.wait_for(state="visible", timeout=5000)
+            except PlaywrightTimeoutError:
                 raise RuntimeError("Could not find email/username field on eLibra login page.")
 
             await email_field.fill(email_value)
 
-            password_field = None
-            password_selectors = [
-                ("get_by_placeholder", "Password", {}),
-                ("get_by_label", "Password", {}),
-                ("locator", "input[type='password']", {}),
-                ("locator", "input[name='password']", {}),
-            ]
-            for method, selector, kwargs in password_selectors:
-                try:
-                    if method == "get_by_placeholder":
-                        candidate = self.page.get_by_placeholder(selector).first
-                    elif method == "get_by_label":
-                        candidate = self.page.get_by_label(selector).first
-                    else:
-                        candidate = self.page.locator(selector).first
-                    if await candidate.is_visible(timeout=1500):
-                        password_field = candidate
-                        logger.info(f"Found password field using {method}: {selector}")
-                        break
-                except Exception:
-                    continue
-
-            if not password_field:
+            password_field = page.locator(_PASSWORD_CSS).first
+            try:
+                await password_field.wait_for(state="visible", timeout=5000)
+            except PlaywrightTimeoutError:
                 raise RuntimeError("Could not find password field on eLibra login page.")
 
             await password_field.fill(password_value)
 
             # CLICK LOGIN BUTTON
             login_clicked = False
-            button_selectors = [
-                ("get_by_role", "button", {"name": re.compile("Sign in|Log in|Login|Войти", re.I)}),
-                ("get_by_text", "Sign in", {}),
-                ("get_by_text", "Log in", {}),
-                ("get_by_text", "Login", {}),
-                ("get_by_text", "Войти", {}),
-                ("locator", "button[type='submit']", {}),
-            ]
-            for method, selector, kwargs in button_selectors:
-                try:
-                    if method == "get_by_role":
-                        btn = self.page.get_by_role(selector, **kwargs).first
-                    elif method == "get_by_text":
-                        btn = self.page.get_by_text(selector).first
-                    else:
-                        btn = self.page.locator(selector).first
-                    if await btn.is_visible(timeout=1500):
-                        await btn.click()
-                        login_clicked = True
-                        logger.info(f"Clicked login button using {method}: {selector}")
-                        break
-                except Exception:
-                    continue
+            login_button = page.get_by_role("button", name=_LOGIN_BUTTON_RE).or_(
+                page.locator(_LOGIN_SUBMIT_CSS)
+            ).first
+            try:
+                await login_button.wait_for(state="visible", timeout=1500)
+                await login_button.click()
+                login_clicked = True
+                logger.info("Clicked login button")
+            except PlaywrightTimeoutError:
+                logger.info("Login button not found, falling back to Enter")
 
             if not login_clicked:
                 # Fallback: press Enter in password field
@@ -282,53 +533,58 @@ class ElibraRPA:
                 raise RuntimeError("Could not find or click login button on eLibra login page.")
 
             try:
-                await self.page.wait_for_url(
-                    lambda u: "/auth/login" not in u,
+                await page.wait_for_url(
+                    lambda u: LOGIN_PATH not in u,
                     timeout=30000,
                 )
-                logger.info(f"Auto-login successful, current URL: {self.page.url}")
+                logger.info(f"Auto-login successful, current URL: {page.url}")
 
                 # После успешного логина eLibra часто редиректит на корень (`{BASE_URL}/`).
                 # Нам же нужно рабочее место выдачи — сразу переходим на ISSUANCE_URL.
                 try:
                     logger.info(f"Navigating to issuance workspace after login: {ISSUANCE_URL}")
-                    await self.page.goto(ISSUANCE_URL, wait_until="networkidle", timeout=30000)
+                    # _ensure_issuance_page waits for the "Search user" input afterwards
+                    await page.goto(ISSUANCE_URL, wait_until="domcontentloaded", timeout=30000)
                 except Exception as nav_e:
                     logger.warning(f"Navigation to issuance after auto-login failed: {nav_e}")
             except PlaywrightTimeoutError:
                 raise RuntimeError("Auto-login timed out: still on /auth/login after submit.")
 
         finally:
-            self._logging_in = False
+            self._login_done.set()
 
-    async def _ensure_issuance_page(self):
+    async def _ensure_issuance_page(self, page: Optional[Page] = None):
         """
         Navigate to issuance page and ensure we are logged in.
         If redirected to /auth/login, perform auto-login (if configured) once.
+        `page` defaults to self.page.
         """
-        await self._ensure_page()
+        if page is None:
+            await self._ensure_page()
+            page = self.page
 
         # Try at most two cycles: load issuance -> maybe login -> load issuance again
         for attempt in range(2):
-            current_url = self.page.url or ""
+            current_url = page.url or ""
 
             # If on login page, auto-login (if credentials are present)
-            if "/auth/login" in current_url:
+            if LOGIN_PATH in current_url:
                 logger.warning("Detected eLibra login page while ensuring issuance page. Trying auto-login...")
-                await self._auto_login_if_needed()
+                await self._auto_login_if_needed(page)
+                current_url = page.url or ""
 
-            current_url = self.page.url or ""
             if ISSUANCE_URL not in current_url:
                 logger.info(f"Navigating to issuance page (current: {current_url})")
-                await self.page.goto(ISSUANCE_URL, wait_until="networkidle", timeout=30000)
+                await page.goto(ISSUANCE_URL, wait_until="domcontentloaded", timeout=30000)
             else:
                 logger.debug("Already on issuance page")
 
-            # Verify that we actually see the issuance UI (Search user input)
+            # Verify that we actually see the issuance UI (Search user input).
+            # This is also the readiness wait after goto, so it covers the SPA's first render.
             try:
-                search_input = self.page.get_by_placeholder("Search user").first
-                await search_input.wait_for(state="visible", timeout=5000)
+                await self._search_input_locator(page).wait_for(state="visible", timeout=10000)
                 # If we got here, we're on the issuance workspace and logged in
+                self._last_login_ok_at = time.monotonic()
                 return
             except Exception:
                 logger.warning("Could not find 'Search user' input on issuance page, maybe session expired?")
@@ -359,35 +615,26 @@ class ElibraRPA:
                         "message": f"RPA initialization failed: {str(e)}"
                     }
             
-            async with self._lock:
-                if not self._initialized or not self.page or self.page.is_closed():
-                    return {
-                        "ok": False,
-                        "page_open": False,
-                        "url": None,
-                        "logged_in": False,
-                        "message": "RPA not initialized or page closed"
-                    }
-                
-                url = self.page.url
-                # Best-effort check: if we're on issuance page and can see search input, likely logged in
-                logged_in = False
-                try:
-                    # Quick check: see if we can find the search input (would fail if not logged in)
-                    await self._ensure_issuance_page()
-                    search_input = self.page.get_by_placeholder("Search user").first
-                    await search_input.wait_for(state="attached", timeout=3000)
-                    logged_in = True
-                except:
-                    logged_in = False
-                
+            # Reports cached state only: no lock, no navigation
+            if not self._initialized or not self.page or self.page.is_closed():
                 return {
-                    "ok": True,
-                    "page_open": True,
-                    "url": url,
-                    "logged_in": logged_in,
-                    "message": "RPA is healthy"
+                    "ok": False,
+                    "page_open": False,
+                    "url": None,
+                    "logged_in": False,
+                    "message": "RPA not initialized or page closed"
                 }
+            
+            # Best-effort: logged in if some operation reached the issuance workspace recently
+            logged_in = time.monotonic() - self._last_login_ok_at < LOGIN_OK_TTL
+            
+            return {
+                "ok": True,
+                "page_open": True,
+                "url": self.page.url,
+                "logged_in": logged_in,
+                "message": "RPA is healthy"
+            }
         except Exception as e:
             return {
                 "ok": False,
@@ -407,7 +654,7 @@ class ElibraRPA:
             await self._ensure_initialized()
             async with self._lock:
                 await self._ensure_page()
-                await self.page.goto(ISSUANCE_URL, wait_until="networkidle", timeout=30000)
+                await self.page.goto(ISSUANCE_URL, wait_until="domcontentloaded", timeout=30000)
                 
                 return {
                     "ok": True,
@@ -436,186 +683,65 @@ class ElibraRPA:
         try:
             # Ensure initialized before acquiring lock to avoid deadlock
             await self._ensure_initialized()
-            async with self._lock:
-                await self._ensure_issuance_page()
+            async with self._search_lock:
+                page = await self._ensure_search_page()
+                await self._ensure_issuance_page(page)
                 
                 # Find search input (left top "Search user")
-                search_input = self.page.get_by_placeholder("Search user").first
+                search_input = self._search_input_locator(page)
                 await search_input.wait_for(state="visible", timeout=10000)
                 
-                # Intercept search API response and requests BEFORE triggering search
+                # Scoped wait for the one search API response; Playwright detaches the
+                # waiter itself, so nothing stays subscribed to page events afterwards
                 results = []
-                reader_id_by_index = {}  # Map index -> reader_id
-                
-                async def handle_request(request):
-                    """Intercept requests to extract reader_id from payload."""
-                    url = request.url
-                    # Log all API requests for debugging
-                    if "/api/" in url:
-                        logger.debug(f"API request: {request.method} {url}")
-                    
-                    # Intercept reader profile requests (happens when clicking on result)
-                    if "/api/interface-service/issuance/action/reader/profile/" in url:
-                        try:
-                            # Check URL params
-                            if "readerId=" in url:
-                                reader_id = int(url.split("readerId=")[1].split("&")[0])
-                                # Try to match with result index (we'll need to track which result was clicked)
-                                # For now, store it - we'll match later
-                                reader_id_by_index["last_clicked"] = reader_id
-                            
-                            # Check request payload
-                            try:
-                                post_data = request.post_data
-                                if post_data:
-                                    import json
-                                    try:
-                                        payload = json.loads(post_data) if isinstance(post_data, str) else post_data
-                                        if isinstance(payload, dict) and "readerId" in payload:
-                                            reader_id = int(payload["readerId"])
-                                            reader_id_by_index["last_clicked"] = reader_id
-                                    except:
-                                        # Try URL-encoded format
-                                        try:
-                                            if "readerId=" in post_data:
-                                                reader_id = int(post_data.split("readerId=")[1].split("&")[0])
-                                                reader_id_by_index["last_clicked"] = reader_id
-                                        except:
-                                            pass
-                            except:
-                                pass
-                        except:
-                            pass
-                
-                async def handle_response(response):
-                    """Intercept responses to get search results and reader_id."""
-                    url = response.url
-                    # Log all API responses for debugging
-                    if "/api/" in url:
-                        logger.debug(f"API response: {response.status} {url}")
-                    
-                    # Intercept search results - check multiple possible URL patterns
-                    # Old API: POST /api/interface-service/issuance/action/reader/profile/list/4?searchValue=...
-                    search_patterns = [
-                        "/api/interface-service/issuance/action/reader/profile/list",
-                        "reader/profile/list",
-                        "/search",
-                        "reader/search"
-                    ]
-                    
-                    if any(pattern in url for pattern in search_patterns):
-                        try:
-                            # Check if response is successful
-                            if response.status >= 200 and response.status < 300:
-                                data = await response.json()
-                                nonlocal results
-                                logger.info(f"Intercepted search response from {url}: type={type(data).__name__}")
-                                
-                                # Extract list from response
-                                if isinstance(data, list):
-                                    results = data
-                                    logger.info(f"Got {len(results)} results as direct list")
-                                elif isinstance(data, dict):
-                                    # Try various possible keys
-                                    for key in ["result", "results", "data", "items", "list"]:
-                                        if key in data and isinstance(data[key], list):
-                                            results = data[key]
-                                            logger.info(f"Got {len(results)} results from data.{key}")
-                                            break
-                                
-                                # Log first result structure for debugging
-                                if results and len(results) > 0:
-                                    logger.debug(f"First result keys: {list(results[0].keys()) if isinstance(results[0], dict) else 'not dict'}")
-                                
-                                # Check if results already have parentId/readerId/id
-                                for result in results:
-                                    if isinstance(result, dict):
-                                        # Try different field names for reader_id
-                                        if "parentId" not in result or not result.get("parentId"):
-                                            if "readerId" in result:
-                                                result["parentId"] = result["readerId"]
-                                            elif "id" in result:
-                                                result["parentId"] = result["id"]
-                                            elif "reader_id" in result:
-                                                result["parentId"] = result["reader_id"]
-                        except Exception as e:
-                            logger.debug(f"Error parsing search response from {url}: {e}")
-                            pass
-                    
-                    # Also check response for reader_id
-                    if "/api/interface-service/issuance/action/reader/profile/" in url:
-                        try:
-                            resp_data = await response.json()
-                            if isinstance(resp_data, dict):
-                                if "readerId" in resp_data:
-                                    reader_id_by_index["last_clicked"] = int(resp_data["readerId"])
-                                elif "id" in resp_data:
-                                    reader_id_by_index["last_clicked"] = int(resp_data["id"])
-                        except:
-                            pass
-                
-                # Set up handlers BEFORE triggering search
-                self.page.on("request", handle_request)
-                self.page.on("response", handle_response)
-                
-                # Clear and type search query
-                await search_input.clear()
-                await search_input.fill(query)
-                await asyncio.sleep(0.2)  # Small delay before pressing Enter
-                
-                # Trigger search - try multiple methods
-                logger.info(f"Triggering search for query: {query}")
-                
-                # Method 1: Press Enter (most common)
-                await search_input.press("Enter")
-                
-                # Also try typing a space and backspace to trigger autocomplete if Enter doesn't work
-                # Some UIs trigger search on input change
-                await asyncio.sleep(0.1)
-                
-                # Wait for search API call with timeout
-                max_wait = 5  # Wait up to 5 seconds for results
-                waited = 0
-                while waited < max_wait and len(results) == 0:
-                    await asyncio.sleep(0.3)
-                    waited += 0.3
-                
-                if len(results) == 0:
-                    logger.warning(f"No results intercepted after {waited}s, waiting a bit more...")
-                    await asyncio.sleep(1)
+                try:
+                    # Clear first: a list request fired for the empty input must not resolve the waiter
+                    await search_input.clear()
+                    async with page.expect_response(functools.partial(_is_search_response, query=query), timeout=6000) as response_info:
+                        await search_input.fill(query)
+                        
+                        logger.info(f"Triggering search for query: {query}")
+                        await search_input.press("Enter")
+                    response = await response_info.value
+                    try:
+                        results = _parse_search_results(_json_loads(await response.body()))
+                        logger.info(f"Intercepted search response from {response.url}: {len(results)} results")
+                    except Exception as e:
+                        logger.debug(f"Error parsing search response from {response.url}: {e}")
+                except PlaywrightTimeoutError:
+                    logger.warning("No search response intercepted after 6s")
                 
-                # Additional wait for UI to render
-                await asyncio.sleep(0.3)
+                # Wait until the UI has rendered the result list (nothing to wait for without results)
+                if results:
+                    try:
+                        await page.wait_for_function(
+                            "css => document.querySelectorAll(css).length > 0", arg=_RESULT_ITEMS_CSS, timeout=2000
+                        )
+                    except PlaywrightTimeoutError:
+                        logger.debug("Search results not rendered as known result elements after 2s")
                 
                 # Try to extract reader_id from DOM elements
                 # Results might have data attributes or IDs containing reader_id
                 try:
-                    # Look for result elements - they might have data-reader-id, data-id, or similar
-                    result_elements = await self.page.locator("[data-reader-id], [data-id], .reader-item, .search-result-item").all()
+                    # Look for result elements - they might have data-reader-id, data-id, or similar.
+                    # One evaluate for all of them instead of up to three get_attribute calls each
+                    attrs = await page.evaluate(_RESULT_ITEM_ATTRS_JS, [_RESULT_ITEMS_CSS, len(results)]) if results else []
                     
-                    for idx, elem in enumerate(result_elements[:len(results)]):
-                        if idx < len(results):
-                            # Try to get reader_id from data attributes
-                            reader_id_attr = await elem.get_attribute("data-reader-id")
-                            if not reader_id_attr:
-                                reader_id_attr = await elem.get_attribute("data-id")
-                            if not reader_id_attr:
-                                # Try to get from onclick or other attributes
-                                onclick = await elem.get_attribute("onclick")
-                                if onclick and "readerId" in onclick:
-                                    import re
-                                    match = re.search(r'readerId[=:](\d+)', onclick)
-                                    if match:
-                                        reader_id_attr = match.group(1)
-                            
-                            if reader_id_attr:
-                                try:
-                                    reader_id = int(reader_id_attr)
-                                    # Update result with reader_id if not present
-                                    if "parentId" not in results[idx] or not results[idx].get("parentId"):
-                                        results[idx]["parentId"] = reader_id
-                                except:
-                                    pass
+                    for idx, (reader_id_attr, onclick) in enumerate(attrs):
+                        if not reader_id_attr and onclick and "readerId" in onclick:
+                            # Try to get from onclick
+                            match = _ONCLICK_READER_ID_RE.search(onclick)
+                            if match:
+                                reader_id_attr = match.group(1)
+                        
+                        if reader_id_attr:
+                            try:
+                                reader_id = int(reader_id_attr)
+                                # Update result with reader_id if not present
+                                if not results[idx].get("parentId"):
+                                    results[idx]["parentId"] = reader_id
+                            except:
+                                pass
                 except Exception as e:
                     logger.debug(f"Could not extract reader_id from DOM: {e}")
                 
@@ -625,48 +751,49 @@ class ElibraRPA:
                 
                 if missing_ids:
                     try:
-                        # Find clickable result elements
-                        result_selectors = [
-                            ".result", "[role='option']", ".reader-item", 
-                            ".search-result", "[data-reader-id]", "[data-id]",
-                            "div[class*='result']", "div[class*='item']", "li[class*='result']"
-                        ]
-                        
-                        result_elements = []
-                        for selector in result_selectors:
-                            try:
-                                elems = await self.page.locator(selector).all()
-                                if elems and len(elems) >= len(results):
-                                    result_elements = elems
-                                    break
-                            except:
-                                continue
+                        # Find clickable result elements: the usual markup in one combined selector,
+                        # the per-selector ladder only if that doesn't cover every result.
+                        # Elements are re-resolved by index at click time, so DOM updates don't leave stale handles
+                        result_elements = page.locator(_RESULT_CLICK_CSS)
+                        result_count = await result_elements.count()
+                        if result_count < len(results):
+                            result_count = 0
+                            for selector in _RESULT_ELEMENT_SELECTORS:
+                                try:
+                                    candidate = page.locator(selector)
+                                    count = await candidate.count()
+                                    if count >= len(results):
+                                        result_elements, result_count = candidate, count
+                                        break
+                                except:
+                                    continue
                         
                         # Click on results that are missing parentId
                         for idx in missing_ids[:5]:  # Limit to first 5 to avoid being too slow
-                            if idx >= len(result_elements):
+                            if idx >= result_count:
                                 continue
                             
                             try:
-                                # Clear the last_clicked before clicking
-                                reader_id_by_index.pop("last_clicked", None)
-                                
-                                elem = result_elements[idx]
+                                elem = result_elements.nth(idx)
                                 # Scroll element into view and click
                                 await elem.scroll_into_view_if_needed()
                                 await asyncio.sleep(0.1)
-                                await elem.click()
-                                await asyncio.sleep(0.4)  # Wait for request
+                                reader_id = None
+                                try:
+                                    async with page.expect_response(_is_reader_profile_response, timeout=1000) as profile_info:
+                                        await elem.click()
+                                    reader_id = await _reader_id_from_profile(await profile_info.value)
+                                except PlaywrightTimeoutError:
+                                    pass
                                 
                                 # Check if we got reader_id
-                                if "last_clicked" in reader_id_by_index:
-                                    reader_id = reader_id_by_index["last_clicked"]
+                                if reader_id:
                                     results[idx]["parentId"] = reader_id
                                     logger.info(f"Got reader_id {reader_id} for result {idx} by clicking")
                                 
                                 # Close any popup/modal with Escape
                                 try:
-                                    await self.page.keyboard.press("Escape")
+                                    await page.keyboard.press("Escape")
                                     await asyncio.sleep(0.1)
                                 except:
                                     pass
@@ -676,19 +803,15 @@ class ElibraRPA:
                     except Exception as e:
                         logger.debug(f"Error clicking results to get reader_id: {e}")
                 
-                # Remove handlers
-                self.page.remove_listener("request", handle_request)
-                self.page.remove_listener("response", handle_response)
-                
-                # If we still don't have parentId in results, try to get from the search response structure
-                # Sometimes the API response already contains parentId
+                # Copy fieldModels [{code, value}, ...] into top-level keys (FIRST_NAME,
+                # LIBRARY_CARD_BARCODE, ...) so callers do one dict lookup per field.
+                # fieldModels itself stays: /api/readers/search returns it to existing clients.
                 for result in results:
-                    if "parentId" not in result or not result.get("parentId"):
-                        # Try to find in nested structures
-                        if "id" in result:
-                            result["parentId"] = result["id"]
-                        elif "readerId" in result:
-                            result["parentId"] = result["readerId"]
+                    if isinstance(result, dict):
+                        for f in result.get("fieldModels") or ():
+                            code = f.get("code")
+                            if code:
+                                result.setdefault(code, f.get("value"))
                 
                 logger.info(f"Search complete: found {len(results)} results")
                 
@@ -717,68 +840,56 @@ class ElibraRPA:
         """
         Verify that a reader is selected by checking if Ant Design card with reader details is visible.
         Returns True if reader card appears to be selected and has data.
+        All checks run in the page in one evaluate call (see _READER_SELECTED_JS).
         """
         try:
-            # Method 1: Check for warning message "Select a reader" - if it's visible, reader is NOT selected
-            warning_select = self.page.locator("text=/Select a reader/i").first
-            try:
-                if await warning_select.is_visible(timeout=300):
-                    logger.debug("'Select a reader' warning is visible - reader NOT selected")
-                    return False
-            except:
-                pass  # Warning not visible is good
-            
-            # Method 2: Check for Ant Design card with reader details
-            # The card has class "ant-card" and contains reader information in "ant-descriptions"
-            try:
-                # Look for the card that contains reader profile details
-                reader_card = self.page.locator(".ant-card:has(.ant-descriptions)").first
-                if await reader_card.is_visible(timeout=500):
-                    logger.debug("Found Ant Design card with descriptions")
-                    
-                    # Check for "Card barcode" label - if it exists, reader is likely selected
-                    card_barcode_label = reader_card.locator("text=/Card barcode/i").first
-                    if await card_barcode_label.is_visible(timeout=300):
-                        logger.debug("Reader selected: found Ant Design card with Card barcode label")
-                        return True
-                    
-                    # Alternative: check for "First Name" or "Last Name" label
-                    first_name_label = reader_card.locator("text=/First Name/i").first
-                    if await first_name_label.is_visible(timeout=300):
-                        logger.debug("Reader selected: found Ant Design card with First Name label")
-                        return True
-            except Exception as e:
-                logger.debug(f"Error checking Ant Design card: {e}")
-            
-            # Method 3: Check for "ant-card-head-title" with reader name (simpler check)
-            try:
-                card_title = self.page.locator(".ant-card-head-title h4").first
-                if await card_title.is_visible(timeout=500):
-                    title_text = await card_title.inner_text()
-                    if title_text and title_text.strip() and len(title_text.strip()) > 2:
-                        logger.debug(f"Reader selected: found card title: {title_text[:30]}")
-                        return True
-            except Exception as e:
-                logger.debug(f"Error checking card title: {e}")
-            
-            # Method 4: Check for ant-descriptions table with reader data
-            try:
-                descriptions_table = self.page.locator(".ant-descriptions table").first
-                if await descriptions_table.is_visible(timeout=500):
-                    # Check if table has multiple rows (reader data)
-                    rows = await descriptions_table.locator("tbody tr").all()
-                    if len(rows) >= 3:  # At least 3 rows means we have reader data
-                        logger.debug(f"Reader selected: found {len(rows)} rows in descriptions table")
-                        return True
-            except Exception as e:
-                logger.debug(f"Error checking descriptions table: {e}")
-                
+            reason = await self.page.evaluate(_READER_SELECTED_JS)
         except Exception as e:
             logger.debug(f"Error verifying reader selection: {e}")
+            return False
+        
+        if reason == "warning":
+            logger.debug("'Select a reader' warning is visible - reader NOT selected")
+            return False
+        if reason:
+            logger.debug(f"Reader selected: {reason}")
+            return True
         
         logger.debug("Reader NOT selected - verification failed all checks")
         return False
-    
+
+    async def _wait_for_reader_selected(self, timeout: float) -> bool:
+        """Like _verify_reader_selected, but waits up to `timeout` ms for the reader card to show up."""
+        try:
+            await self.page.wait_for_function(_READER_SELECTED_WAIT_JS, polling=100, timeout=timeout)
+            return True
+        except PlaywrightTimeoutError:
+            return False
+        except Exception as e:
+            logger.debug(f"Error waiting for reader selection: {e}")
+            return False
+
+    async def _wait_for_matching_option(self, query: str, timeout: float = 5000) -> Optional[Locator]:
+        """
+        First dropdown option matching the (lowercased) query, or None if none shows up in time.
+        eLibra may show a generic user list before the filtered one, so this waits for a real match
+        instead of taking the first option.
+        """
+        if not query:
+            return None
+        option = self.page.locator(_matching_option_css(query)).first
+        try:
+            await option.wait_for(state="visible", timeout=timeout)
+        except PlaywrightTimeoutError:
+            return None
+        return option
+
+    async def _wait_for_dialog_closed(self, timeout: float = 1000) -> None:
+        try:
+            await self.page.locator("[role='dialog']:visible").first.wait_for(state="hidden", timeout=timeout)
+        except PlaywrightTimeoutError:
+            logger.debug("Dialog still visible after closing it")
+
     async def issue_item(self, barcode: str, reader_id: int, loan_days: int = 14, reader_query: Optional[str] = None) -> Dict[str, Any]:
         """
         Issue a book item via UI.
@@ -837,7 +948,11 @@ class ElibraRPA:
                         
                         if await element.is_visible(timeout=2000):
                             await element.click()
-                            await asyncio.sleep(0.5)  # Wait for tab switch
+                            # Wait for the tab switch: the radio button turns checked
+                            try:
+                                await self.page.locator(_ISSUANCE_TAB_CHECKED_CSS).first.wait_for(state="visible", timeout=2000)
+                            except PlaywrightTimeoutError:
+                                logger.debug("Issuance radio did not report checked state, continuing")
                             issuance_tab_clicked = True
                             logger.info(f"✓ Clicked Issuance tab using selector: {selector}")
                             break
@@ -897,123 +1012,50 @@ class ElibraRPA:
                         }
                     
                     try:
-                        search_input = self.page.get_by_placeholder("Search user").first
+                        search_input = self._search_input_locator(self.page)
                         await search_input.wait_for(state="visible", timeout=10000)
                         
                         # IMPORTANT: Click on the field FIRST to activate it (user says dropdown only appears if field is clicked)
                         logger.info("Clicking on search input field to activate it...")
                         await search_input.click()
-                        await asyncio.sleep(0.5)  # Wait for field to be fully focused/activated
                         
                         # CRITICAL: Clear the field completely (even if it has old text like "Aidar")
                         # We MUST clear it to avoid confusion - old text doesn't mean reader is selected!
                         logger.info("Clearing search field (removing any old text)...")
                         await search_input.clear()
-                        await asyncio.sleep(0.3)
                         
                         # Verify field is actually empty
                         current_value = await search_input.input_value()
                         if current_value and current_value.strip():
                             # Field still has value, try more aggressive clearing
                             await search_input.press("Control+a")  # Select all
-                            await asyncio.sleep(0.1)
                             await search_input.press("Delete")  # Delete
-                            await asyncio.sleep(0.2)
                             logger.info(f"Field had value '{current_value}', cleared it")
                         
                         # Click again to ensure field is active and ready for input
                         await search_input.click()
-                        await asyncio.sleep(0.3)
                         
                         # Type the query character by character (more realistic, triggers autocomplete better)
                         logger.info(f"Typing search query: {search_query}")
                         await search_input.type(search_query, delay=50)  # 50ms delay between characters
-                        await asyncio.sleep(0.5)  # Wait a bit after typing
                         
                         # Wait for Ant Design Select dropdown to appear
                         # Ant Design uses: .ant-select-dropdown:not(.ant-select-dropdown-hidden)
                         logger.info("Waiting for Ant Design dropdown to appear...")
-                        dropdown_visible = False
-                        dropdown_container = None
                         
                         # Wait up to 5 seconds for dropdown to appear (user says it takes 1-2 seconds, maybe more)
-                        for attempt in range(20):  # 20 * 0.25s = 5 seconds
-                            try:
-                                # Look for Ant Design dropdown that is NOT hidden
-                                dropdown_selector = ".ant-select-dropdown:not(.ant-select-dropdown-hidden)"
-                                dropdown_container = self.page.locator(dropdown_selector).first
-                                
-                                if await dropdown_container.is_visible(timeout=250):
-                                    logger.info(f"✓ Ant Design dropdown appeared after ~{attempt * 0.25:.1f}s")
-                                    dropdown_visible = True
-                                    break
-                            except:
-                                pass
-                            
-                            await asyncio.sleep(0.25)
-                        
-                        if not dropdown_visible:
+                        try:
+                            await self.page.locator(_OPEN_DROPDOWN_CSS).first.wait_for(state="visible", timeout=5000)
+                            logger.info("✓ Ant Design dropdown appeared")
+                        except PlaywrightTimeoutError:
                             logger.warning("Ant Design dropdown did not appear, trying to find options directly...")
-                            await asyncio.sleep(1.0)  # Extra wait
                         
-                        # Find Ant Design option elements
-                        reader_selected = False
-
                         # ВАЖНО: eLibra сначала может показать "общий" список пользователей,
                         # а уже потом – отфильтрованный по нашему запросу.
                         # Поэтому мы ждем, пока в тексте опций появится совпадение с нашим search_query
                         # (card_barcode / имя), а не кликаем первый элемент сразу.
-
-                        option_to_click = None
                         normalized_query = (search_query or "").strip().lower()
-
-                        for attempt in range(10):  # до ~5 секунд (10 * 0.5s)
-                            options = []
-                            try:
-                                # Method 1: Find options in visible dropdown
-                                options = await self.page.locator(
-                                    ".ant-select-dropdown:not(.ant-select-dropdown-hidden) [role='option']"
-                                ).all()
-                                logger.info(f"Attempt {attempt+1}: found {len(options)} options in dropdown")
-                            except Exception as e:
-                                logger.warning(f"Error finding options: {e}")
-
-                            # If no options, try fallback
-                            if not options:
-                                try:
-                                    all_options = await self.page.locator("[role='option']").all()
-                                    for opt in all_options:
-                                        try:
-                                            if await opt.is_visible(timeout=100):
-                                                options.append(opt)
-                                        except:
-                                            continue
-                                    logger.info(f"Attempt {attempt+1}: found {len(options)} options via fallback")
-                                except:
-                                    pass
-
-                            # Пытаемся найти опцию, в которой ТЕКСТ реально соответствует нашему запросу
-                            if options:
-                                for opt in options:
-                                    try:
-                                        title = await opt.get_attribute("title") or ""
-                                        text = await opt.inner_text() or ""
-                                        combined = f"{title} {text}".lower()
-
-                                        # Для card_barcode ожидаем точное вхождение строки
-                                        # Для имени – тоже ищем подстроку
-                                        if normalized_query and normalized_query in combined:
-                                            option_to_click = opt
-                                            logger.info(f"Matched option by query '{normalized_query}': {(title or text)[:80]}")
-                                            break
-                                    except Exception as e:
-                                        logger.debug(f"Error inspecting option: {e}")
-
-                            if option_to_click:
-                                break
-
-                            # Если список еще "старый" (нет совпадений), подождем и попробуем еще раз
-                            await asyncio.sleep(0.5)
+                        option_to_click = await self._wait_for_matching_option(normalized_query)
 
                         # Если так и не нашли совпадающую опцию — лучше зафейлить, чем кликнуть первого Шона
                         if not option_to_click:
@@ -1031,13 +1073,11 @@ class ElibraRPA:
                                 "reader_id": reader_id,
                             }
 
+                        label = await option_to_click.get_attribute("title") or await option_to_click.inner_text()
+                        logger.info(f"Matched option by query '{normalized_query}': {label[:80]}")
                         logger.info("=== CLICKING MATCHED OPTION NOW ===")
 
-                        # NOW CLICK IT!
-                        # Scroll into view
-                        await option_to_click.scroll_into_view_if_needed()
-                        await asyncio.sleep(0.2)
-
+                        # NOW CLICK IT! (the click scrolls the option into view itself)
                         # CLICK THE CONTENT DIV (most reliable for Ant Design)
                         logger.info("=== ATTEMPTING CLICK ===")
                         clicked = False
@@ -1061,39 +1101,25 @@ class ElibraRPA:
                                 logger.error(f"Direct click also failed: {e2}")
                                 # Last resort: JavaScript
                                 try:
-                                    await self.page.evaluate("el => el.click()", option_to_click)
+                                    await option_to_click.evaluate("el => el.click()")
                                     clicked = True
                                     logger.info("✓✓✓ CLICKED VIA JAVASCRIPT!")
                                 except Exception as e3:
                                     logger.error(f"All clicks failed: {e3}")
                         
                         if clicked:
-                            # Wait for reader card
+                            # Wait for the reader card (up to ~6.5s, as the old card wait + re-checks did)
                             logger.info("Waiting for reader card...")
-                            await asyncio.sleep(2.5)
-                            
-                            if await self._verify_reader_selected():
+                            if await self._wait_for_reader_selected(timeout=6500):
                                 reader_selected = True
                                 logger.info("✓✓✓ READER SELECTED!")
                             else:
-                                logger.warning("Card not visible yet, waiting more...")
-                                await asyncio.sleep(2.0)
-                                if await self._verify_reader_selected():
-                                    reader_selected = True
-                                    logger.info("✓✓✓ READER SELECTED (after wait)!")
-                                else:
-                                    logger.error("✗✗✗ READER CARD STILL NOT VISIBLE!")
+                                logger.error("✗✗✗ READER CARD STILL NOT VISIBLE!")
                         else:
                             logger.error("✗✗✗ CLICK FAILED - READER NOT SELECTED!")
                         
-                        # Final check
                         if not reader_selected:
                             logger.warning(f"Reader {reader_id} was not selected after dropdown click")
-                            # One last verification attempt
-                            await asyncio.sleep(0.5)
-                            if await self._verify_reader_selected():
-                                reader_selected = True
-                                logger.info("Reader card appeared on final check")
                     except Exception as e:
                         logger.warning(f"Error searching/selecting reader: {e}")
                         # Don't continue - we need reader to be selected!
@@ -1118,29 +1144,13 @@ class ElibraRPA:
                 await barcode_input.fill(barcode)
                 await barcode_input.press("Enter")
                 
-                # Step 4: Wait for modal dialog to appear
-                await asyncio.sleep(0.5)  # Wait for modal animation
-                
-                # Find the modal (try multiple selectors)
-                modal_selectors = [
-                    "[role='dialog']",
-                    ".modal",
-                    ".dialog",
-                    "[class*='modal']",
-                    "[class*='dialog']",
-                    "div:has-text('issuance-book')",
-                ]
-                
+                # Step 4: Wait for modal dialog to appear (any of the known modal selectors)
                 modal_visible = False
-                for selector in modal_selectors:
-                    try:
-                        modal = self.page.locator(selector).first
-                        if await modal.is_visible(timeout=2000):
-                            modal_visible = True
-                            logger.debug(f"Found modal with selector: {selector}")
-                            break
-                    except:
-                        continue
+                try:
+                    await self.page.locator(_ISSUE_MODAL_CSS).first.wait_for(state="visible", timeout=3000)
+                    modal_visible = True
+                except PlaywrightTimeoutError:
+                    pass
                 
                 if not modal_visible:
                     logger.warning("Modal dialog not found, continuing anyway...")
@@ -1156,23 +1166,11 @@ class ElibraRPA:
                 ]
                 
                 # Find return-date input field
-                date_input_selectors = [
-                    "input[placeholder*='дату']",
-                    "input[placeholder*='date']",
-                    "input[placeholder*='Выберите']",
-                    "input[label*='return-date']",
-                    "input[label*='return date']",
-                    "input[name*='return']",
-                    "input[name*='date']",
-                    "input[type='date']",
-                    "input[type='text']",  # Some date pickers use text input
-                ]
-                
                 date_filled = False
                 date_input_element = None
                 
                 # First, find the date input element
-                for selector in date_input_selectors:
+                for selector in _DATE_INPUT_SELECTORS:
                     try:
                         date_input = self.page.locator(selector).first
                         if await date_input.is_visible(timeout=2000):
@@ -1219,17 +1217,13 @@ class ElibraRPA:
                         
                         # Click to focus the input
                         await date_input_element.click()
-                        await asyncio.sleep(0.1)
                         
                         # Select all and replace
                         await date_input_element.press("Control+a")
-                        await asyncio.sleep(0.1)
                         await date_input_element.fill(date_str)
-                        await asyncio.sleep(0.2)
                         
                         # Press Tab to move to next field (triggers validation/acceptance)
                         await date_input_element.press("Tab")
-                        await asyncio.sleep(0.3)
                         
                         # Verify value was accepted
                         value = await date_input_element.input_value()
@@ -1242,7 +1236,6 @@ class ElibraRPA:
                             await date_input_element.press("Control+a")
                             await date_input_element.fill(date_str)
                             await date_input_element.press("Enter")
-                            await asyncio.sleep(0.2)
                             value = await date_input_element.input_value()
                             if value:
                                 date_filled = True
@@ -1256,29 +1249,16 @@ class ElibraRPA:
                 # Step 6: Intercept network request to detect success/failure
                 issue_response_data = None
                 
-                async def handle_issue_response(response):
-                    if "/api/interface-service/issuance/action/issue/book/item" in response.url:
-                        try:
-                            nonlocal issue_response_data
-                            issue_response_data = await response.json()
-                        except:
-                            pass
-                
-                self.page.on("response", handle_issue_response)
-                
                 # Step 7: Click "Issuance" button in modal
-                # Wait a bit for date to be processed
-                await asyncio.sleep(0.3)
-                
-                # Find Issuance button in modal (not the tab)
-                issuance_button_found = False
-                issuance_button_selectors = [
-                    "button:has-text('Issuance')",
-                    "button[type='submit']",
-                    "[role='button']:has-text('Issuance')",
-                ]
+                # Wait until the modal shows an Issuance button (not the tab) once the date is processed
+                try:
+                    await self.page.locator(_ISSUANCE_BUTTON_CSS).first.wait_for(state="visible", timeout=2000)
+                except PlaywrightTimeoutError:
+                    pass
                 
-                for selector in issuance_button_selectors:
+                # Find Issuance button in modal (not the tab), in selector priority order
+                issuance_button = None
+                for selector in _ISSUANCE_BUTTON_SELECTORS:
                     try:
                         buttons = await self.page.locator(selector).all()
                         for btn in buttons:
@@ -1287,26 +1267,28 @@ class ElibraRPA:
                             if aria_selected is None:  # Not a tab
                                 # Check if button is visible
                                 if await btn.is_visible(timeout=500):
-                                    await btn.click()
-                                    issuance_button_found = True
-                                    logger.info("Clicked Issuance button in modal")
+                                    issuance_button = btn
                                     break
-                        if issuance_button_found:
+                        if issuance_button is not None:
                             break
                     except:
                         continue
                 
-                if not issuance_button_found:
-                    logger.warning("Could not find Issuance button in modal, trying Enter key")
-                    await self.page.keyboard.press("Enter")
-                
-                # Step 5: Wait for response (max 5 seconds)
-                for _ in range(10):  # Check every 0.5s for 5s
-                    await asyncio.sleep(0.5)
-                    if issue_response_data is not None:
-                        break
-                
-                self.page.remove_listener("response", handle_issue_response)
+                # Step 5: Wait for response (max ~5 seconds after the click), returns as soon as it arrives.
+                # The waiter raises on exit when nothing arrives, so the UI-based detection below takes over.
+                try:
+                    async with self.page.expect_response(_is_issue_response, timeout=5000) as issue_info:
+                        if issuance_button is not None:
+                            await issuance_button.click()
+                            logger.info("Clicked Issuance button in modal")
+                        else:
+                            logger.warning("Could not find Issuance button in modal, trying Enter key")
+                            await self.page.keyboard.press("Enter")
+                    issue_response_data = _json_loads(await (await issue_info.value).body())
+                except PlaywrightTimeoutError:
+                    logger.debug("No issue API response caught, falling back to UI detection")
+                except Exception as e:
+                    logger.debug(f"Could not get issue response: {e}")
                 
                 # Determine success/failure from API response
                 ok = False
@@ -1327,8 +1309,11 @@ class ElibraRPA:
                         ok = True
                         message = "Issue completed (unexpected response format)"
                 else:
-                    # No API response caught, try UI-based detection
-                    await asyncio.sleep(0.5)
+                    # No API response caught, try UI-based detection once the UI shows an outcome
+                    try:
+                        await self.page.locator(_OUTCOME_INDICATOR_CSS).first.wait_for(state="visible", timeout=1000)
+                    except PlaywrightTimeoutError:
+                        pass
                     error_indicators = [
                         self.page.get_by_text("error", exact=False),
                         self.page.get_by_text("failed", exact=False),
@@ -1370,23 +1355,12 @@ class ElibraRPA:
                 if not ok:
                     try:
                         # Try to find and close the modal dialog
-                        modal_close_selectors = [
-                            "[role='dialog'] button[aria-label*='close' i]",
-                            "[role='dialog'] button[aria-label*='Close' i]",
-                            "[role='dialog'] .ant-modal-close",
-                            "[role='dialog'] button:has-text('Close')",
-                            "[role='dialog'] button:has-text('×')",
-                            ".ant-modal-close",
-                            ".ant-modal button[aria-label='Close']",
-                        ]
-                        
-                        for selector in modal_close_selectors:
+                        for selector in _MODAL_CLOSE_SELECTORS:
                             try:
                                 close_btn = self.page.locator(selector).first
                                 if await close_btn.is_visible(timeout=500):
                                     await close_btn.click()
                                     logger.info("Closed error modal dialog after issue failure")
-                                    await asyncio.sleep(0.3)
                                     break
                             except:
                                 continue
@@ -1394,8 +1368,8 @@ class ElibraRPA:
                         # Fallback: press Escape to close modal
                         try:
                             await self.page.keyboard.press("Escape")
-                            await asyncio.sleep(0.2)
                             logger.info("Pressed Escape to close modal after issue failure")
+                            await self._wait_for_dialog_closed()
                         except:
                             pass
                     except Exception as e:
@@ -1477,7 +1451,11 @@ class ElibraRPA:
                         
                         if await element.is_visible(timeout=2000):
                             await element.click()
-                            await asyncio.sleep(0.5)  # Wait for tab switch
+                            # Wait for the tab switch: the radio button turns checked
+                            try:
+                                await self.page.locator(_RETURN_TAB_CHECKED_CSS).first.wait_for(state="visible", timeout=2000)
+                            except PlaywrightTimeoutError:
+                                logger.debug("Return radio did not report checked state, continuing")
                             return_tab_clicked = True
                             logger.debug(f"Successfully clicked Return tab using {method}: {selector}")
                             break
@@ -1495,74 +1473,33 @@ class ElibraRPA:
                     
                     try:
                         # Use the same approach as issue_item - click field, type, wait for dropdown, click option
-                        search_input = self.page.get_by_placeholder("Search user").first
+                        search_input = self._search_input_locator(self.page)
                         await search_input.wait_for(state="visible", timeout=10000)
                         
                         # Click to activate field
                         await search_input.click()
-                        await asyncio.sleep(0.5)
                         await search_input.clear()
-                        await asyncio.sleep(0.3)
                         await search_input.click()
-                        await asyncio.sleep(0.3)
                         
                         # Type the query
                         logger.info(f"Typing search query for return: {search_query}")
                         await search_input.type(search_query, delay=50)
-                        await asyncio.sleep(1.0)
                         
                         # Wait for Ant Design dropdown
                         dropdown_ready = False
-                        for attempt in range(20):
-                            try:
-                                dropdown = self.page.locator(".ant-select-dropdown:not(.ant-select-dropdown-hidden)").first
-                                if await dropdown.is_visible(timeout=200):
-                                    options = await dropdown.locator("[role='option']").all()
-                                    if options and len(options) > 0:
-                                        logger.info(f"Dropdown ready with {len(options)} options")
-                                        dropdown_ready = True
-                                        break
-                            except:
-                                pass
-                            await asyncio.sleep(0.25)
+                        try:
+                            await self.page.locator(f"{_OPEN_DROPDOWN_CSS} [role='option']").first.wait_for(state="visible", timeout=5000)
+                            logger.info("Dropdown ready with options")
+                            dropdown_ready = True
+                        except PlaywrightTimeoutError:
+                            pass
                         
                         # Find and click matching option (wait for filtered results, don't click first generic item)
                         if dropdown_ready:
-                            option_to_click = None
                             normalized_query = (reader_query or "").strip().lower()
                             
                             # Wait for dropdown to be filtered by search query (same logic as issue_item)
-                            for attempt in range(10):  # до ~5 секунд (10 * 0.5s)
-                                options = []
-                                try:
-                                    options = await self.page.locator(
-                                        ".ant-select-dropdown:not(.ant-select-dropdown-hidden) [role='option']"
-                                    ).all()
-                                    logger.info(f"Return: Attempt {attempt+1}: found {len(options)} options in dropdown")
-                                except Exception as e:
-                                    logger.warning(f"Error finding options: {e}")
-                                
-                                # Try to find option that matches our search query
-                                if options:
-                                    for opt in options:
-                                        try:
-                                            title = await opt.get_attribute("title") or ""
-                                            text = await opt.inner_text() or ""
-                                            combined = f"{title} {text}".lower()
-                                            
-                                            # For card_barcode expect exact match or substring
-                                            if normalized_query and normalized_query in combined:
-                                                option_to_click = opt
-                                                logger.info(f"Return: Matched option by query '{normalized_query}': {(title or text)[:80]}")
-                                                break
-                                        except Exception as e:
-                                            logger.debug(f"Error inspecting option: {e}")
-                                
-                                if option_to_click:
-                                    break
-                                
-                                # If list still shows generic items, wait and try again
-                                await asyncio.sleep(0.5)
+                            option_to_click = await self._wait_for_matching_option(normalized_query)
                             
                             # If no matching option found, abort
                             if not option_to_click:
@@ -1581,8 +1518,8 @@ class ElibraRPA:
                             
                             # Click the matched option
                             try:
-                                await option_to_click.scroll_into_view_if_needed()
-                                await asyncio.sleep(0.2)
+                                label = await option_to_click.get_attribute("title") or await option_to_click.inner_text()
+                                logger.info(f"Return: Matched option by query '{normalized_query}': {label[:80]}")
                                 
                                 # Click content div (Ant Design)
                                 try:
@@ -1597,16 +1534,11 @@ class ElibraRPA:
                                     await option_to_click.click(timeout=3000)
                                     logger.info("✓ Clicked option directly for return")
                                 
-                                await asyncio.sleep(1.5)  # Wait for reader card
-                                
-                                # Verify reader is selected
-                                if await self._verify_reader_selected():
+                                # Wait for the reader card (up to 2.5s, as the old fixed waits did)
+                                if await self._wait_for_reader_selected(timeout=2500):
                                     logger.info("✓ Reader selected and verified for return")
                                 else:
-                                    logger.warning("Reader card not visible after click, waiting more...")
-                                    await asyncio.sleep(1.0)
-                                    if not await self._verify_reader_selected():
-                                        logger.error("✗ Reader card still not visible after return selection")
+                                    logger.error("✗ Reader card still not visible after return selection")
                             except Exception as e:
                                 logger.error(f"Error clicking option for return: {e}")
                                 return {
@@ -1628,15 +1560,10 @@ class ElibraRPA:
                 # Step 3: Intercept network request to detect success/failure
                 return_response_data = None
                 
-                async def handle_return_response(response):
-                    if "/api/interface-service/issuance/action/return/book/item" in response.url:
-                        try:
-                            nonlocal return_response_data
-                            return_response_data = await response.json()
-                        except:
-                            pass
-                
-                self.page.on("response", handle_return_response)
+                # Registered before the click so a fast response is not missed
+                response_waiter = asyncio.ensure_future(
+                    self.page.wait_for_event("response", predicate=_is_return_response, timeout=5000)
+                )
                 
                 # Click Return button or press Enter
                 buttons = await self.page.locator("button:has-text('Return')").all()
@@ -1647,131 +1574,98 @@ class ElibraRPA:
                         action_button = btn
                         break
                 
-                if action_button:
-                    await action_button.click()
-                else:
-                    await barcode_input.press("Enter")
+                try:
+                    if action_button:
+                        await action_button.click()
+                    else:
+                        await barcode_input.press("Enter")
+                except BaseException:
+                    response_waiter.cancel()
+                    raise
                 
-                # Step 3.5: Check for security warning modal (check multiple times)
+                # Step 3.5: Security warning modal
                 # eLibra shows: "The book is given to another reader. Are you sure you want to return the book?"
                 # SECURITY: We should NOT automatically confirm this - reject the return immediately
-                
-                def check_warning_modal():
-                    """Helper function to check for warning modal and handle it."""
-                    warning_modal_selectors = [
-                        ".ant-modal-confirm:has-text('Warning')",
-                        ".ant-modal-confirm:has-text('The book is given to another reader')",
-                        ".ant-modal-confirm:has-text('given to another reader')",
-                        "[role='dialog'].ant-modal-confirm",
-                        ".ant-modal.ant-modal-confirm",
-                        "[role='dialog'][aria-modal='true'].ant-modal-confirm",
-                    ]
+                warning_modal = self.page.locator(_WARNING_MODAL_CSS).filter(has_text=_WARNING_MODAL_TEXT_RE).first
+                warning_waiter = asyncio.ensure_future(warning_modal.wait_for(state="visible", timeout=5000))
+                
+                # Step 4: Wait for response OR warning modal (max 5 seconds), whichever comes first
+                done, pending = await asyncio.wait((response_waiter, warning_waiter), return_when=asyncio.FIRST_COMPLETED)
+                for task in pending:
+                    task.cancel()
+                # Timeouts are expected here (the other outcome happened or nothing did)
+                warning_shown = warning_waiter in done and warning_waiter.exception() is None
+                response = response_waiter.result() if response_waiter in done and response_waiter.exception() is None else None
+                
+                if warning_shown:
+                    logger.warning("SECURITY WARNING: Book is given to another reader - rejecting return")
                     
-                    for selector in warning_modal_selectors:
-                        try:
-                            modal = self.page.locator(selector).first
-                            if modal and modal.is_visible():
-                                # Verify it's the right modal by checking content
-                                modal_text = modal.inner_text()
-                                if "given to another reader" in modal_text.lower() or ("warning" in modal_text.lower() and "book" in modal_text.lower()):
-                                    return modal
-                        except:
-                            continue
-                    return None
-                
-                # Step 4: Wait for response OR warning modal (max 5 seconds)
-                warning_handled = False
-                for wait_attempt in range(10):  # 10 * 0.5s = 5 seconds
-                    await asyncio.sleep(0.5)
+                    # Click Cancel button
+                    cancel_clicked = False
                     
-                    # Check for warning modal on each iteration
+                    # Method 1: Find by text "Отмена"
                     try:
-                        modal = self.page.locator(".ant-modal-confirm").first
-                        if await modal.is_visible(timeout=200):
-                            modal_text = await modal.inner_text()
-                            if "given to another reader" in modal_text.lower() or ("warning" in modal_text.lower() and "book" in modal_text.lower()):
-                                logger.warning("SECURITY WARNING: Book is given to another reader - rejecting return")
-                                
-                                # Click Cancel button
-                                cancel_clicked = False
-                                
-                                # Method 1: Find by text "Отмена"
-                                try:
-                                    cancel_btn = modal.locator(".ant-modal-confirm-btns button:has-text('Отмена')").first
-                                    if await cancel_btn.is_visible(timeout=500):
-                                        await cancel_btn.click()
-                                        logger.info("✓ Clicked Cancel (found by text 'Отмена')")
-                                        cancel_clicked = True
-                                        await asyncio.sleep(0.5)
-                                except:
-                                    pass
-                                
-                                # Method 2: Find by class ant-btn-default
-                                if not cancel_clicked:
-                                    try:
-                                        cancel_btn = modal.locator(".ant-modal-confirm-btns .ant-btn-default").first
-                                        if await cancel_btn.is_visible(timeout=500):
-                                            btn_text = await cancel_btn.inner_text()
-                                            if "Отмена" in btn_text or "Cancel" in btn_text:
-                                                await cancel_btn.click()
-                                                logger.info(f"✓ Clicked Cancel (found by class, text: {btn_text})")
-                                                cancel_clicked = True
-                                                await asyncio.sleep(0.5)
-                                    except:
-                                        pass
-                                
-                                # Method 3: First button (usually Cancel)
-                                if not cancel_clicked:
-                                    try:
-                                        buttons = await modal.locator(".ant-modal-confirm-btns button").all()
-                                        if len(buttons) >= 2:
-                                            cancel_btn = buttons[0]
-                                            btn_text = await cancel_btn.inner_text()
-                                            if "Отмена" in btn_text or "Cancel" in btn_text:
-                                                await cancel_btn.click()
-                                                logger.info(f"✓ Clicked Cancel (first button, text: {btn_text})")
-                                                cancel_clicked = True
-                                                await asyncio.sleep(0.5)
-                                    except:
-                                        pass
-                                
-                                # If modal detected, return error immediately (don't wait for API response)
-                                if cancel_clicked:
-                                    self.page.remove_listener("response", handle_return_response)
-                                    await asyncio.sleep(0.3)
-                                    return {
-                                        "ok": False,
-                                        "message": "Книга выдана другому читателю. Возврат отклонен по соображениям безопасности.",
-                                        "barcode": barcode,
-                                        "security_warning": True
-                                    }
-                                else:
-                                    # Try Escape as fallback
-                                    await self.page.keyboard.press("Escape")
-                                    await asyncio.sleep(0.3)
-                                    self.page.remove_listener("response", handle_return_response)
-                                    return {
-                                        "ok": False,
-                                        "message": "Книга выдана другому читателю. Возврат отклонен по соображениям безопасности.",
-                                        "barcode": barcode,
-                                        "security_warning": True
-                                    }
+                        cancel_btn = warning_modal.locator(".ant-modal-confirm-btns button:has-text('Отмена')").first
+                        if await cancel_btn.is_visible(timeout=500):
+                            await cancel_btn.click()
+                            logger.info("✓ Clicked Cancel (found by text 'Отмена')")
+                            cancel_clicked = True
                     except:
                         pass
                     
-                    # Check if API response received
-                    if return_response_data is not None:
-                        break
+                    # Method 2: Find by class ant-btn-default
+                    if not cancel_clicked:
+                        try:
+                            cancel_btn = warning_modal.locator(".ant-modal-confirm-btns .ant-btn-default").first
+                            if await cancel_btn.is_visible(timeout=500):
+                                btn_text = await cancel_btn.inner_text()
+                                if "Отмена" in btn_text or "Cancel" in btn_text:
+                                    await cancel_btn.click()
+                                    logger.info(f"✓ Clicked Cancel (found by class, text: {btn_text})")
+                                    cancel_clicked = True
+                        except:
+                            pass
+                    
+                    # Method 3: First button (usually Cancel)
+                    if not cancel_clicked:
+                        try:
+                            buttons = await warning_modal.locator(".ant-modal-confirm-btns button").all()
+                            if len(buttons) >= 2:
+                                cancel_btn = buttons[0]
+                                btn_text = await cancel_btn.inner_text()
+                                if "Отмена" in btn_text or "Cancel" in btn_text:
+                                    await cancel_btn.click()
+                                    logger.info(f"✓ Clicked Cancel (first button, text: {btn_text})")
+                                    cancel_clicked = True
+                        except:
+                            pass
+                    
+                    if not cancel_clicked:
+                        # Try Escape as fallback
+                        await self.page.keyboard.press("Escape")
+                    
+                    # Return error immediately (don't wait for API response), once the modal is gone
+                    try:
+                        await warning_modal.wait_for(state="hidden", timeout=2000)
+                    except PlaywrightTimeoutError:
+                        logger.debug("Warning modal still visible after cancelling it")
+                    return {
+                        "ok": False,
+                        "message": "Книга выдана другому читателю. Возврат отклонен по соображениям безопасности.",
+                        "barcode": barcode,
+                        "security_warning": True
+                    }
                 
-                self.page.remove_listener("response", handle_return_response)
+                if response is not None:
+                    try:
+                        return_response_data = _json_loads(await response.body())
+                    except:
+                        pass
                 
                 # Determine success/failure from API response and UI
                 ok = False
                 message = "Return action completed"
                 
-                # Wait a bit for UI to update
-                await asyncio.sleep(0.5)
-                
                 # Check API response first
                 if return_response_data:
                     if isinstance(return_response_data, dict):
@@ -1799,6 +1693,12 @@ class ElibraRPA:
                 
                 # Fallback to UI detection if API response doesn't clearly indicate success
                 if not ok or return_response_data is None:
+                    # Give the UI a moment to show an outcome message
+                    try:
+                        await self.page.locator(_OUTCOME_INDICATOR_CSS).first.wait_for(state="visible", timeout=500)
+                    except PlaywrightTimeoutError:
+                        pass
+                    
                     # Check for error indicators
                     error_indicators = [
                         self.page.get_by_text("error", exact=False),
@@ -1860,23 +1760,12 @@ class ElibraRPA:
                 if not ok:
                     try:
                         # Try to find and close any error modal/dialog
-                        modal_close_selectors = [
-                            "[role='dialog'] button[aria-label*='close' i]",
-                            "[role='dialog'] button[aria-label*='Close' i]",
-                            "[role='dialog'] .ant-modal-close",
-                            "[role='dialog'] button:has-text('Close')",
-                            "[role='dialog'] button:has-text('×')",
-                            ".ant-modal-close",
-                            ".ant-modal button[aria-label='Close']",
-                        ]
-                        
-                        for selector in modal_close_selectors:
+                        for selector in _MODAL_CLOSE_SELECTORS:
                             try:
                                 close_btn = self.page.locator(selector).first
                                 if await close_btn.is_visible(timeout=500):
                                     await close_btn.click()
                                     logger.info("Closed error modal/dialog after return failure")
-                                    await asyncio.sleep(0.3)
                                     break
                             except:
                                 continue
@@ -1884,8 +1773,8 @@ class ElibraRPA:
                         # Fallback: press Escape to close modal
                         try:
                             await self.page.keyboard.press("Escape")
-                            await asyncio.sleep(0.2)
                             logger.info("Pressed Escape to close modal after return failure")
+                            await self._wait_for_dialog_closed()
                         except:
                             pass
                     except Exception as e:
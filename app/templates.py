@@ -0,0 +1,402 @@
+"""
+HTML pages (submit/admin results and the admin pages) as Jinja2 templates, compiled once at import.
+Autoescaping is on, so messages coming back from eLibra are rendered safely.
+"""
+import hashlib
+from operator import itemgetter
+from pathlib import Path
+
+import jinja2
+
+_SOURCES = {
+    # Shared by every submit/admin result page: ok=True is the green card, False the red one
+    "result_card.html": """
+<html>
+  <head>
+    <meta charset="utf-8"/>
+    <meta name="viewport" content="width=device-width, initial-scale=1"/>
+    <meta name="generator" content="AB2025"/>
+    <!-- AB2025 -->
+  </head>
+  <body style="font-family:system-ui,-apple-system,Segoe UI,Roboto,Arial;background:#0b0f14;color:#e7edf5;margin:0;">
+    <div style="max-width:480px;margin:40px auto;padding:16px;">
+      {% if ok %}
+      <div style="background:#0f1623;border:1px solid #1f2b40;border-radius:18px;padding:18px;text-align:center;">
+      {% else %}
+      <div style="background:#241216;border:1px solid #4b1f25;border-radius:18px;padding:18px;text-align:center;">
+      {% endif %}
+        <h2 style="margin:0 0 8px;font-size:20px;">{{ title }}</h2>
+        {% if message %}
+        <p style="margin:0 0 12px;font-size:14px;color:{{ '#9fb0c5' if ok else '#fca5a5' }};">
+          {{ message }}
+        </p>
+        {% endif %}
+        <button onclick="window.location.href='{{ back_url }}'"
+                style="margin-top:8px;padding:12px 18px;border-radius:999px;border:none;background:#1d4ed8;color:#fff;font-size:15px;font-weight:500;width:100%;max-width:260px;cursor:pointer;">
+          {{ back_label }}
+        </button>
+      </div>
+    </div>
+  <div style="display:none;visibility:hidden;opacity:0;position:absolute;left:-9999px" data-dev="AB2025"></div>
+  </body>
+</html>
+""",
+    "admin_search.html": """
+<html>
+  <head>
+    <meta charset="utf-8"/>
+    <meta name="viewport" content="width=device-width, initial-scale=1"/>
+    <meta name="generator" content="AB2025"/>
+    <!-- AB2025 -->
+    <title>Admin — Search Readers</title>
+    <link rel="stylesheet" href="{{ static_url("admin_search.css") }}"/>
+  </head>
+  <body>
+    <h2>🔍 Search Readers</h2>
+    <div class="card">
+      <label>Поиск читателя (имя / email / cardcode)</label>
+      <input id="readerSearch" placeholder="например: aidar / a.begotayev... / 2100000004099"/>
+      <button type="button" id="btnSearch" onclick="searchReaders()">🔎 Найти</button>
+      <div id="status" class="status"></div>
+      <div id="readerResults"></div>
+    </div>
+    <a href="/admin/returns?pin={{ pin }}" class="back-link">← Back to admin</a>
+  </body>
+  <script>
+    let isSearching = false;
+
+    // Reader fields come from eLibra, so escape them before building innerHTML
+    const HTML_ESCAPES = {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"};
+    const esc = (v) => String(v ?? "").replace(/[&<>"']/g, (ch) => HTML_ESCAPES[ch]);
+
+    async function searchReaders(){
+      if (isSearching) return;
+
+      const q = (document.getElementById("readerSearch").value || "").trim();
+      if (q.length < 2) {
+        document.getElementById("status").innerText = "Введите минимум 2 символа";
+        return;
+      }
+
+      isSearching = true;
+      const btn = document.getElementById("btnSearch");
+      const input = document.getElementById("readerSearch");
+      const status = document.getElementById("status");
+      const results = document.getElementById("readerResults");
+
+      btn.disabled = true;
+      btn.classList.add("loading");
+      input.disabled = true;
+      status.innerText = "🔎 Ищу читателя…";
+      status.className = "status status-loading";
+      results.innerHTML = "";
+
+      try {
+        const res = await fetch(`/api/readers/search?q=${encodeURIComponent(q)}`);
+        const data = await res.json();
+        const el = data.elibra;
+
+        let readerList = [];
+        if (Array.isArray(el)) readerList = el;
+        else if (el && Array.isArray(el.result)) readerList = el.result;
+        else if (el && Array.isArray(el.results)) readerList = el.results;
+
+        if (!readerList.length) {
+          status.innerText = "Не найдено";
+          status.className = "status";
+          return;
+        }
+
+        readerList.slice(0, 25).forEach(item => {
+          const readerId = item.parentId;
+          const first = item.FIRST_NAME || "";
+          const last = item.LAST_NAME || "";
+          const email = item.EMAIL || "";
+          const card = item.LIBRARY_CARD_BARCODE || "";
+
+          const div = document.createElement("div");
+          div.className = "result";
+          div.innerHTML = `
+            <b>${esc(first)} ${esc(last)}</b>
+            <div class="small">reader_id: <b>${esc(readerId)}</b> • card: ${esc(card || "-")}</div>
+            <div class="small">${esc(email)}</div>
+          `;
+          results.appendChild(div);
+        });
+
+        status.innerText = `Найдено: ${readerList.length} читателей`;
+        status.className = "status";
+      } catch (error) {
+        status.innerText = "Ошибка при поиске. Попробуйте ещё раз.";
+        status.className = "status";
+        console.error("Search error:", error);
+      } finally {
+        isSearching = false;
+        btn.disabled = false;
+        btn.classList.remove("loading");
+        input.disabled = false;
+      }
+    }
+
+    document.getElementById("readerSearch").addEventListener("keydown", (e) => {
+      if (e.key === "Enter") {
+        e.preventDefault();
+        searchReaders();
+      }
+    });
+  </script>
+</html>
+""",
+    "admin_returns.html": """
+<html>
+  <head>
+    <meta charset="utf-8"/>
+    <meta name="viewport" content="width=device-width, initial-scale=1, maximum-scale=1"/>
+    <meta name="generator" content="AB2025"/>
+    <!-- AB2025 -->
+    <title>Admin — Return Requests</title>
+    <link rel="stylesheet" href="{{ static_url("admin_returns.css") }}"/>
+  </head>
+  <body>
+    <div style="text-align:center;margin-bottom:16px;">
+      <h2 style="margin:8px 0;">Pending returns</h2>
+      <div class="meta">Всего заявок: {{ rows|length }}</div>
+      <div style="margin-top:8px;display:flex;gap:8px;justify-content:center;flex-wrap:wrap">
+        <a href="/admin/search?pin={{ pin }}" style="display:inline-block;padding:8px 16px;background:#1d4ed8;color:#fff;text-decoration:none;border-radius:999px;font-size:14px;">🔍 Search Readers</a>
+        <a href="/admin/stats?pin={{ pin }}" style="display:inline-block;padding:8px 16px;background:#1d4ed8;color:#fff;text-decoration:none;border-radius:999px;font-size:14px;">📊 Статистика и логи</a>
+      </div>
+    </div>
+    {% for r in rows %}{% include "returns_card.html" %}{% else %}<p style='text-align:center;'>Нет заявок</p>{% endfor %}
+    <script>
+      document.addEventListener('DOMContentLoaded', function() {
+        document.querySelectorAll('.admin-form').forEach(function(form) {
+          form.addEventListener('submit', function(e) {
+            const formId = form.id;
+            const reqId = formId.split('-').pop();
+            const action = formId.includes('approve') ? 'approve' : 'reject';
+
+            const btn = form.querySelector('button[type="submit"]');
+            if (!btn || btn.disabled) {
+              e.preventDefault();
+              return false;
+            }
+
+            const card = form.closest('.card');
+            if (card) {
+              const allBtns = card.querySelectorAll('button.admin-btn');
+              allBtns.forEach(function(b) {
+                b.disabled = true;
+                b.style.opacity = '0.5';
+                b.style.pointerEvents = 'none';
+              });
+
+              const statusEl = document.createElement('div');
+              statusEl.style.cssText = 'text-align:center;padding:8px;color:#666;font-size:13px;';
+              statusEl.textContent = action === 'approve' ? '⏳ Обрабатываем...' : '⏳ Отклоняем...';
+              card.appendChild(statusEl);
+            }
+
+            return true;
+          });
+        });
+      });
+    </script>
+  </body>
+</html>
+""",
+    "returns_card.html": """
+{% set rid, barcode, reader_id, created_at, created_ip = return_card_fields(r) %}
+<div class="card">
+  <div class="card-header">
+    <b>Request #{{ rid }}</b>
+    <span class="pill-id">{{ barcode }}</span>
+  </div>
+  <div class="row-small">Reader ID: <code>{{ reader_id or "" }}</code></div>
+  <div class="row-small">Created: {{ created_at }}</div>
+  <div class="row-small">IP: {{ created_ip or "" }}</div>
+  <div class="btn-row">
+    <form method="POST" action="/admin/returns/{{ rid }}/reject" class="admin-form" id="form-reject-{{ rid }}">
+    <input type="hidden" name="pin" value="{{ pin }}"/>
+      <button type="submit" class="admin-btn reject" id="btn-reject-{{ rid }}">❌ Reject</button>
+  </form>
+    <form method="POST" action="/admin/returns/{{ rid }}/approve" class="admin-form" id="form-approve-{{ rid }}">
+    <input type="hidden" name="pin" value="{{ pin }}"/>
+      <button type="submit" class="admin-btn approve" id="btn-approve-{{ rid }}">✅ Approve</button>
+  </form>
+  </div>
+</div>
+""",
+    # Sent before the stats queries run, so the browser can fetch the CSS meanwhile
+    "admin_stats_head.html": """
+<html>
+  <head>
+    <meta charset="utf-8"/>
+    <meta name="viewport" content="width=device-width, initial-scale=1, maximum-scale=1"/>
+    <meta name="generator" content="AB2025"/>
+    <!-- AB2025 -->
+    <title>Admin - Statistics</title>
+    <link rel="stylesheet" href="{{ static_url("admin_stats.css") }}"/>
+  </head>
+  <body>
+    <div class="header">
+      <h1>📊 Статистика системы</h1>
+      <a href="{{ back_href }}" class="back-link">← Back to pending returns</a>
+    </div>
+""",
+    "admin_stats.html": """
+    <div class="stats-grid">
+      {% for tone, value, label in kpis %}
+      <div class="stat-card">
+        <div class="stat-value" style="color:{{ kpi_colors[tone] }};">{{ value }}</div>
+        <div class="stat-label">{{ label }}</div>
+      </div>
+      {% endfor %}
+    </div>
+
+    <div class="section">
+      <div class="section-title">📚 Последние выданные книги ({{ total_issued }})</div>
+      <div id="list-issued">
+      {% for book in issued_books %}{% include "stats_issued_card.html" %}{% else %}<p style='text-align:center;color:#666;'>Нет выданных книг</p>{% endfor %}
+      </div>
+      {% if issued_cursor %}<div style="text-align:center;"><button type="button" class="back-link more-btn" data-kind="issued" data-cursor="{{ issued_cursor }}">Показать ещё</button></div>{% endif %}
+    </div>
+
+    <div class="section">
+      <div class="section-title">↩️ Все заявки на возврат ({{ total_returns }})</div>
+      <div id="list-returns">
+      {% for ret in all_returns %}{% include "stats_return_card.html" %}{% else %}<p style='text-align:center;color:#666;'>Нет заявок</p>{% endfor %}
+      </div>
+      {% if returns_cursor %}<div style="text-align:center;"><button type="button" class="back-link more-btn" data-kind="returns" data-cursor="{{ returns_cursor }}">Показать ещё</button></div>{% endif %}
+    </div>
+
+    <div style="text-align:center;margin-top:32px;">
+      <a href="{{ back_href }}" class="back-link">← Back to pending returns</a>
+    </div>
+    <script>
+      document.querySelectorAll(".more-btn").forEach(btn => {
+        btn.addEventListener("click", async () => {
+          btn.disabled = true;
+          const params = new URLSearchParams({pin: {{ pin|tojson }}, kind: btn.dataset.kind, cursor: btn.dataset.cursor});
+          try {
+            const res = await fetch("/admin/stats/more?" + params);
+            const data = await res.json();
+            document.getElementById("list-" + btn.dataset.kind).insertAdjacentHTML("beforeend", data.html || "");
+            if (data.next_cursor) {
+              btn.dataset.cursor = data.next_cursor;
+              btn.disabled = false;
+            } else {
+              btn.remove();
+            }
+          } catch (e) {
+            btn.disabled = false;
+          }
+        });
+      });
+    </script>
+  </body>
+</html>
+""",
+    "stats_issued_card.html": """
+{% set bid, barcode, reader_id, card_barcode, loan_days, issued_at = issued_card_fields(book) %}
+<div class="card">
+  <div class="card-header">
+    <b>#{{ bid }}</b>
+    <span class="pill-id">{{ barcode }}</span>
+  </div>
+  <div class="row-small">Reader ID: <code>{{ reader_id or "" }}</code></div>
+  <div class="row-small">Card: <code>{{ card_barcode or "" }}</code></div>
+  <div class="row-small">Loan days: {{ loan_days }}</div>
+  <div class="row-small">Issued: {{ issued_at }}</div>
+</div>
+""",
+    "stats_return_card.html": """
+{% set rid, barcode, status, reader_id, created_at, approved_at = stats_return_card_fields(ret) %}
+<div class="card">
+  <div class="card-header">
+    <b>Request #{{ rid }}</b>
+    <span class="pill-id">{{ barcode }}</span>
+    <span style="padding:2px 8px;border-radius:999px;background:{{ status_color(status) }};color:#fff;font-size:11px;">
+      {{ status }}
+    </span>
+  </div>
+  <div class="row-small">Reader ID: <code>{{ reader_id or "" }}</code></div>
+  <div class="row-small">Created: {{ created_at }}</div>
+  {% if approved_at %}<div class='row-small'>Approved: {{ approved_at }}</div>{% endif %}
+</div>
+""",
+}
+
+# Badge colour per return_requests.status on /admin/stats
+STATUS_COLORS = {
+    "PENDING": "#f59e0b",
+    "PROCESSING": "#2563eb",
+    "APPROVED": "#16a34a",
+    "REJECTED": "#dc2626",
+}
+STATUS_COLOR_DEFAULT = "#666"
+# Value colour per KPI tile tone on /admin/stats
+KPI_COLORS = {
+    "good": "#16a34a",
+    "warn": "#f59e0b",
+    "bad": "#dc2626",
+}
+
+
+STATIC_DIR = Path(__file__).parent / "static"
+_static_urls: dict[str, str] = {}
+
+
+def static_url(name: str) -> str:
+    """/static URL with a content hash, so long-cached assets still change on deploy."""
+    url = _static_urls.get(name)
+    if url is None:
+        digest = hashlib.md5((STATIC_DIR / name).read_bytes()).hexdigest()[:8]
+        url = _static_urls[name] = f"/static/{name}?v={digest}"
+    return url
+
+
+def status_color(status: str) -> str:
+    return STATUS_COLORS.get(status, STATUS_COLOR_DEFAULT)
+
+env = jinja2.Environment(
+    loader=jinja2.DictLoader(_SOURCES),
+    auto_reload=False,
+    autoescape=True,
+    # Compiled bytecode survives restarts, so workers skip parsing on startup
+    bytecode_cache=jinja2.FileSystemBytecodeCache(),
+)
+env.globals["status_color"] = status_color
+env.globals["static_url"] = static_url
+env.globals["kpi_colors"] = KPI_COLORS
+# sqlite3.Row name lookups are linear in the column list; each card pulls its
+# fields out in one C-level itemgetter call and unpacks them with {% set %}
+env.globals["return_card_fields"] = itemgetter("id", "barcode", "reader_id", "created_at", "created_ip")
+env.globals["issued_card_fields"] = itemgetter("id", "barcode", "reader_id", "card_barcode", "loan_days", "issued_at")
+env.globals["stats_return_card_fields"] = itemgetter("id", "barcode", "status", "reader_id", "created_at", "approved_at")
+
+RESULT_CARD = env.get_template("result_card.html")
+ADMIN_SEARCH = env.get_template("admin_search.html")
+# Card lists are rendered with {% for %} + {% include %} instead of string +=
+ADMIN_RETURNS = env.get_template("admin_returns.html")
+ADMIN_STATS_HEAD = env.get_template("admin_stats_head.html")
+ADMIN_STATS = env.get_template("admin_stats.html")
+# Single cards for /admin/stats/more pages
+STATS_ISSUED_CARD = env.get_template("stats_issued_card.html")
+STATS_RETURN_CARD = env.get_template("stats_return_card.html")
+
+
+
+def result_page(title: str, message: str = "", ok: bool = True, back_url: str = "/scan", back_label: str = "← Back to scan") -> str:
+    """Green (ok) or red result card with a single back button."""
+    return RESULT_CARD.render(title=title, message=message, ok=ok, back_url=back_url, back_label=back_label)
+
+
+def admin_result_page(title: str, pin: str, message: str = "", ok: bool = True) -> str:
+    return result_page(title, message, ok, back_url=f"/admin/returns?pin={pin}", back_label="← Back to admin")
+
+
+# No variables, so rendered once
+RETURN_OK_HTML = result_page(
+    "✅ Заявка на возврат создана",
+    "Возврат будет подтвержден библиотекарем после физического приема книги.",
+)
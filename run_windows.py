@@ -22,11 +22,14 @@ import platform
 try:
     import _set_event_loop_policy  # noqa: F401
 except ImportError:
-    # Fallback if file doesn't exist
+    # Fallback if file doesn't exist: winloop if installed, otherwise ProactorEventLoop
     import asyncio
     if platform.system() == "Windows":
-        policy = asyncio.get_event_loop_policy()
-        if not isinstance(policy, asyncio.WindowsProactorEventLoopPolicy):
+        try:
+            import winloop
+            asyncio.set_event_loop_policy(winloop.EventLoopPolicy())
+            print("✓ [run_windows.py] Set Windows event loop policy to winloop (fallback)")
+        except ImportError:
             asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
             print("✓ [run_windows.py] Set Windows event loop policy to ProactorEventLoop (fallback)")
 
@@ -97,6 +100,11 @@ if __name__ == "__main__":
         print("   To use HTTPS, run: python generate_self_signed_cert.py")
         use_https = False
     
+    # Reloader children are fresh interpreters: put the project root on PYTHONPATH
+    # so sitecustomize.py sets the event loop policy before anything else is imported
+    project_root = os.path.dirname(os.path.abspath(__file__))
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [project_root, os.environ.get("PYTHONPATH")]))
+    
     protocol = "https" if use_https else "http"
     print(f"🚀 Starting uvicorn on {protocol}://{host}:{port} (reload={reload})")
     print("📝 Press CTRL+C to stop")
@@ -106,8 +114,8 @@ if __name__ == "__main__":
         host=host,
         port=port,
         reload=reload,
-        reload_includes=["_set_event_loop_policy.py", "app/main.py", "app/rpa_elibra.py"] if reload else None,
-        loop="asyncio",  # Ensure uvicorn uses the asyncio loop (with our policy)
+        reload_includes=["_set_event_loop_policy.py", "sitecustomize.py", "app/main.py", "app/rpa_elibra.py"] if reload else None,
+        loop="none",  # Let uvicorn use the policy set by _set_event_loop_policy (winloop / Proactor)
         ssl_keyfile=ssl_keyfile,
         ssl_certfile=ssl_certfile
     )
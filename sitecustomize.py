@@ -0,0 +1,12 @@
+"""
+Interpreter startup hook: sets the event loop policy before ANY other import.
+
+Python imports ``sitecustomize`` automatically during startup when it is on
+``sys.path`` (project root via PYTHONPATH, or copied into site-packages).
+This beats dependencies that touch asyncio before app/main.py is imported.
+The actual logic lives in _set_event_loop_policy.py; later imports of it are no-ops.
+"""
+try:
+    import _set_event_loop_policy  # noqa: F401
+except ImportError:
+    pass
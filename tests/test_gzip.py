@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("APP_ACTIVATION_KEY", "AB2025-ELIBRA-MIDDLEWARE-AIDAR-BEGOTAYEV")
+os.environ.setdefault("APP_ACTIVATION_PASSWORD", "AB2025-PROJECT")
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "gateway.db"))
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+class ScanGzipTest(unittest.TestCase):
+    """GZipMiddleware must not leak one client's encoding into the next /scan response."""
+
+    def setUp(self):
+        self.client = TestClient(app)
+
+    def test_plain_request_after_gzip_request(self):
+        gzipped = self.client.get("/scan", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(gzipped.headers.get("content-encoding"), "gzip")
+
+        plain = self.client.get("/scan", headers={"Accept-Encoding": "identity"})
+        self.assertEqual(plain.status_code, 200)
+        self.assertNotIn("content-encoding", plain.headers)
+        self.assertEqual(int(plain.headers["content-length"]), len(plain.content))
+        self.assertIn("</html>", plain.content.decode("utf-8"))
+
+
+if __name__ == "__main__":
+    unittest.main()